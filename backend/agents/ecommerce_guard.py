@@ -1,13 +1,60 @@
 import re
+import json
 import time
+import asyncio
+import hashlib
 import logging
-from typing import Optional, Dict
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import Optional, Dict, List
 from pydantic import BaseModel, Field
 from schemas import AnalysisRequest, Flag
-from llm import call_structured_llm
+from llm import call_structured_llm, image_media_type
 
 logger = logging.getLogger(__name__)
 
+# --- Regex Patterns ---
+# Compiled once at import; extract_security_elements runs them on every request.
+
+# Opening tags of every element extract_security_elements collects. One scan
+# over the document finds all of them; bodies are then located with a forward
+# search for the closing tag instead of a DOTALL findall per element type.
+SECURITY_TAG_RE = re.compile(r'<(iframe|form|meta|h1|script|input)\b[^>]*>', re.IGNORECASE)
+CLOSING_TAG_RES = {
+    name: re.compile(rf'</{name}>', re.IGNORECASE)
+    for name in ("iframe", "form", "h1", "script")
+}
+META_KEYWORD_RE = re.compile(r'security|csp|x-frame|cors|og:title|og:price|product:price', re.IGNORECASE)
+JSON_LD_OPEN = '<script type="application/ld+json"'
+# Only this many of each element reach the prompt, so the scan stops keeping them after that
+TAG_LIMITS = {"iframe": 20, "form": 15, "h1": 3}
+
+CRITICAL_INPUT_RE = re.compile(r'password|email|card|cvv|payment')
+# The thousands/decimal groups share a character class, so a run like
+# ".123.456.12" can be split several ways; possessive quantifiers stop the
+# engine from retrying those splits.
+PRICE_PATTERN = r'[\$€£¥]\s?(?>\d{1,3}(?:[,.]\d{3})*+)(?:[.,]\d{2})?+'
+PRICE_CTX_RE = re.compile(rf'(.{{0,50}})({PRICE_PATTERN})(.{{0,50}})')
+# Starts with a character class, so the engine skips ahead to currency
+# symbols in C instead of trying the leading context group at every offset.
+PRICE_RE = re.compile(PRICE_PATTERN)
+PRICE_ELEM_RE = re.compile(r'<[^>]*class=["\'][^"\']*(?:price|amount|cost)[^"\']*["\'][^>]*>.*?<', re.IGNORECASE)
+TAG_STRIP_RE = re.compile(r'<[^>]+>')
+
+# Pages above MAX_HTML are sampled: the head (meta, JSON-LD, titles) plus the
+# tail, where body scripts often hold price widgets.
+MAX_HTML = 512 * 1024
+HEAD_BYTES = 384 * 1024
+
+# Extension re-submits the same page HTML on refreshes and retries.
+# Key: blake2b digest of the HTML (keeps large strings out of memory)
+# Value: extract_security_elements output
+_extraction_cache: "OrderedDict[bytes, Dict[str, str]]" = OrderedDict()
+EXTRACTION_CACHE_SIZE = 64
+# Extraction runs in worker threads, so cache updates are serialized
+_extraction_cache_lock = threading.Lock()
+
 # --- Result Schemas ---
 
 class VisualSecurityCheck(BaseModel):
@@ -29,11 +76,146 @@ class PriceSecurityCheck(BaseModel):
 
 # --- Extraction Helper ---
 
+def _scan_security_tags(html_content: str) -> Dict[str, list]:
+    """
+    Single pass over the HTML collecting iframes, forms, relevant meta tags,
+    JSON-LD script bodies and h1 elements.
+    Iframe bodies are replaced with "[...]" since only their attributes matter.
+    Forms are returned as (opening tag, input tags) pairs; inputs are attached
+    to the form whose span contains them as the scan walks past.
+    Like re.findall, matches of the same element type never overlap.
+    iframes, forms and h1 elements are capped at TAG_LIMITS.
+    """
+    found: Dict[str, list] = {"iframe": [], "form": [], "meta": [], "script": [], "h1": []}
+    resume_at = dict.fromkeys(found, 0)
+    # Once a closing tag is missing, every later search for it fails as well
+    unclosed = set()
+    form_inputs = None
+
+    for match in SECURITY_TAG_RE.finditer(html_content):
+        name = match.group(1).lower()
+        tag = match.group()
+
+        if name == "input":
+            if form_inputs is not None and match.end() <= resume_at["form"]:
+                form_inputs.append(tag)
+            continue
+        if match.start() < resume_at[name]:
+            continue
+        if name in TAG_LIMITS and len(found[name]) >= TAG_LIMITS[name]:
+            continue
+
+        if name == "meta":
+            if META_KEYWORD_RE.search(tag):
+                found["meta"].append(tag)
+            continue
+        if name == "script" and not tag.lower().startswith(JSON_LD_OPEN):
+            continue
+
+        close = None
+        if name not in unclosed:
+            close = CLOSING_TAG_RES[name].search(html_content, match.end())
+            if not close:
+                unclosed.add(name)
+
+        if close:
+            if name == "script":
+                found["script"].append(html_content[match.end():close.start()])
+            elif name == "form":
+                form_inputs = []
+                found["form"].append((tag, form_inputs))
+            elif name == "iframe":
+                found["iframe"].append(f"{tag}[...]{close.group()}")
+            else:
+                found[name].append(html_content[match.start():close.end()])
+            resume_at[name] = close.end()
+        elif name == "iframe" and tag.endswith("/>"):
+            found["iframe"].append(tag)
+
+    return found
+
+def _find_prices_with_context(html_content: str, limit: int) -> List[tuple]:
+    """
+    Same matches as PRICE_CTX_RE.finditer, without running the context group
+    over the whole document.
+    A match starts at the first offset with a valid price at most 50
+    characters ahead on the same line, so each search jumps straight to the
+    next price and anchors the full pattern there.
+    """
+    results = []
+    pos = 0
+    while len(results) < limit:
+        price = PRICE_RE.search(html_content, pos)
+        if not price:
+            break
+        start = max(pos, price.start() - 50, html_content.rfind('\n', pos, price.start()) + 1)
+        match = PRICE_CTX_RE.match(html_content, start)
+        results.append(match.groups())
+        pos = match.end()
+    return results
+
+def _strip_tags(text: str, repl: str = '') -> str:
+    """Removes markup, skipping the regex for fragments that contain no tags."""
+    if '<' not in text:
+        return text.strip()
+    return TAG_STRIP_RE.sub(repl, text).strip()
+
+PRODUCT_LD_TYPES = {"Product", "Offer", "AggregateOffer"}
+
+def _ld_name(value) -> Optional[str]:
+    """brand/seller may be a plain string or a {"@type": ..., "name": ...} node."""
+    if isinstance(value, dict):
+        return value.get("name")
+    if isinstance(value, str):
+        return value
+    return None
+
+def _compact_product_ld(node: dict) -> dict:
+    """Keep only the fields the price check needs from a Product/Offer node."""
+    offers = node.get("offers") if "offers" in node else node
+    if isinstance(offers, list):
+        offers = offers[0] if offers else {}
+    if not isinstance(offers, dict):
+        offers = {}
+
+    compact = {
+        "type": node.get("@type"),
+        "name": node.get("name"),
+        "brand": _ld_name(node.get("brand")),
+        "sku": node.get("sku"),
+        "price": offers.get("price", offers.get("lowPrice")),
+        "highPrice": offers.get("highPrice"),
+        "priceCurrency": offers.get("priceCurrency"),
+        "availability": offers.get("availability"),
+    }
+    return {k: v for k, v in compact.items() if v not in (None, "", [])}
+
+def _find_product_ld(doc) -> List[dict]:
+    """Walks a parsed JSON-LD document (single node, list or @graph) for product nodes."""
+    found = []
+    stack = [doc]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            types = node.get("@type")
+            types = set(types) if isinstance(types, list) else {types}
+            if types & PRODUCT_LD_TYPES:
+                found.append(_compact_product_ld(node))
+            elif "@graph" in node:
+                stack.append(node["@graph"])
+    return found
+
 def extract_security_elements(html_content: str) -> Dict[str, str]:
     """
     Parses HTML to extract specific security-relevant sections.
     Returns a dict with 'iframes', 'forms', 'meta', 'price_context'.
     """
+    if len(html_content) > MAX_HTML:
+        logger.info(f"HTML truncated for extraction ({len(html_content)} chars)")
+        html_content = html_content[:HEAD_BYTES] + "\n<!--TRUNCATED-->\n" + html_content[-(MAX_HTML - HEAD_BYTES):]
+
     elements = {
         "iframes": [],
         "forms": [],
@@ -41,67 +223,76 @@ def extract_security_elements(html_content: str) -> Dict[str, str]:
         "price_context": []
     }
     
+    tags = _scan_security_tags(html_content)
+
     # Extract IFRAMES
-    iframe_pattern = r'<iframe[^>]*>.*?</iframe>|<iframe[^>]*/>'
-    iframes = re.findall(iframe_pattern, html_content, re.IGNORECASE | re.DOTALL)
-    for idx, iframe in enumerate(iframes[:20], 1):
-        # Truncate content inside iframe
-        iframe_short = re.sub(r'>.*?</iframe>', '>[...]</iframe>', iframe, flags=re.DOTALL)
-        elements["iframes"].append(f"iframe_{idx}: {iframe_short[:500]}")
+    iframes = tags["iframe"]
+    for idx, iframe in enumerate(iframes, 1):
+        elements["iframes"].append(f"iframe_{idx}: {iframe[:500]}")
     
     # Extract FORMS
-    form_pattern = r'<form[^>]*>.*?</form>'
-    forms = re.findall(form_pattern, html_content, re.IGNORECASE | re.DOTALL)
-    for idx, form in enumerate(forms[:15], 1):
-        form_details = []
-        form_tag = re.search(r'<form[^>]*>', form, re.IGNORECASE)
-        if form_tag:
-            form_details.append(f"tag: {form_tag.group()}")
+    forms = tags["form"]
+    for idx, (form_tag, inputs) in enumerate(forms, 1):
+        form_details = [f"tag: {form_tag}"]
         
-        # Inputs
-        inputs = re.findall(r'<input[^>]*>', form, re.IGNORECASE)
-        hidden_inputs = [inp for inp in inputs if 'hidden' in inp.lower()]
+        # Inputs, classified once each
+        hidden_inputs = []
+        critical_inputs = []
+        for inp in inputs:
+            inp_lower = inp.lower()
+            if len(hidden_inputs) < 10 and 'hidden' in inp_lower:
+                hidden_inputs.append(inp)
+            if len(critical_inputs) < 5 and CRITICAL_INPUT_RE.search(inp_lower):
+                critical_inputs.append(inp)
+            if len(hidden_inputs) == 10 and len(critical_inputs) == 5:
+                break
         
         if hidden_inputs:
-            form_details.append("hidden_inputs: " + ", ".join(hidden_inputs[:10]))
+            form_details.append("hidden_inputs: " + ", ".join(hidden_inputs))
             
-        critical_inputs = [inp for inp in inputs if any(t in inp.lower() for t in ['password', 'email', 'card', 'cvv', 'payment'])]
         if critical_inputs:
-            form_details.append("critical_inputs: " + ", ".join(critical_inputs[:5]))
+            form_details.append("critical_inputs: " + ", ".join(critical_inputs))
             
         elements["forms"].append(f"form_{idx}: " + " | ".join(form_details))
 
     # Extract META
-    meta_pattern = r'<meta[^>]*(?:security|csp|x-frame|cors|og:title|og:price|product:price)[^>]*>'
-    meta_tags = re.findall(meta_pattern, html_content, re.IGNORECASE)
+    meta_tags = tags["meta"]
     elements["meta"] = meta_tags[:15]
 
     # Extract PRICE & PRODUCT Context
     # 0. Look for JSON-LD (Best source for structured product data)
-    json_ld_pattern = r'<script type="application/ld\+json"[^>]*>(.*?)</script>'
-    json_ld_scripts = re.findall(json_ld_pattern, html_content, re.IGNORECASE | re.DOTALL)
+    json_ld_scripts = tags["script"]
     
     # 1. Look for currency symbols with numbers near them
-    price_pattern = r'[\$€£¥]\s?\d{1,3}(?:[,.]\d{3})*(?:[.,]\d{2})?'
     # Find prices with some context to distinguish main price from others
     # We capture 50 chars of context before and after
-    prices_with_context = re.findall(r'(.{0,50})(' + price_pattern + r')(.{0,50})', html_content)
+    prices_with_context = _find_prices_with_context(html_content, 15)
     
     # 2. Look for elements likely containing product names (h1, h2, classes with 'title', 'name')
     # Simple heuristic: grab h1 tags
-    h1_tags = re.findall(r'<h1[^>]*>.*?</h1>', html_content, re.IGNORECASE | re.DOTALL)
+    h1_tags = tags["h1"]
     
     # 3. Look for elements with class/id related to price
-    price_elements = re.findall(r'<[^>]*class=["\'][^"\']*(?:price|amount|cost)[^"\']*["\'][^>]*>.*?<', html_content, re.IGNORECASE)
+    price_elements = [m.group() for m in islice(PRICE_ELEM_RE.finditer(html_content), 5)]
 
     if json_ld_scripts:
-        # Filter for scripts that mention "Product" or "Offer"
-        relevant_scripts = [script for script in json_ld_scripts if '"Product"' in script or '"Offer"' in script]
-        if relevant_scripts:
-             elements["price_context"].append("JSON-LD Structured Data (HIGH RELIABILITY):\n" + "\n---\n".join(relevant_scripts[:2]))
+        # Only the product/offer fields go to the LLM, not whole JSON-LD blobs
+        products = []
+        for script in json_ld_scripts:
+            if '"Product"' not in script and '"Offer"' not in script:
+                continue
+            try:
+                doc = json.loads(script)
+            except ValueError:
+                continue
+            products.extend(_find_product_ld(doc))
+            if len(products) >= 2:
+                break
+        if products:
+             elements["price_context"].append("JSON-LD Structured Data (HIGH RELIABILITY):\n" + "\n---\n".join(json.dumps(p, ensure_ascii=False) for p in products[:2]))
 
     if h1_tags:
-        elements["price_context"].append("Possible Product Titles: " + " | ".join([re.sub(r'<[^>]+>', '', t).strip() for t in h1_tags[:3]]))
+        elements["price_context"].append("Possible Product Titles: " + " | ".join([_strip_tags(t) for t in h1_tags]))
     
     # Add meta tags relevant to product/price to context
     product_meta = [m for m in meta_tags if 'og:title' in m or 'price' in m]
@@ -110,16 +301,15 @@ def extract_security_elements(html_content: str) -> Dict[str, str]:
 
     if price_elements:
         # Clean tags to just show text content
-        clean_prices = [re.sub(r'<[^>]+>', '', p).strip() for p in price_elements[:5]]
+        clean_prices = [_strip_tags(p) for p in price_elements]
         elements["price_context"].append("Price Elements Content: " + ", ".join([p for p in clean_prices if p]))
         
     if prices_with_context:
         # Limit to first 15 prices to avoid token overflow, but provide context
-        formatted_prices = []
-        for pre, price, post in prices_with_context[:15]:
-             clean_pre = re.sub(r'<[^>]+>', ' ', pre).strip()
-             clean_post = re.sub(r'<[^>]+>', ' ', post).strip()
-             formatted_prices.append(f"...{clean_pre} [ {price} ] {clean_post}...")
+        formatted_prices = [
+            f"...{_strip_tags(pre, ' ')} [ {price} ] {_strip_tags(post, ' ')}..."
+            for pre, price, post in prices_with_context
+        ]
         elements["price_context"].append("Visible Prices with Context: " + "\n".join(formatted_prices))
 
     return {
@@ -129,11 +319,54 @@ def extract_security_elements(html_content: str) -> Dict[str, str]:
         "price_context": "\n".join(elements["price_context"])
     }
 
+def get_security_elements(html_content: str) -> Dict[str, str]:
+    """
+    Cached front for extract_security_elements, keyed by a digest of the HTML.
+    """
+    key = hashlib.blake2b(html_content.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    with _extraction_cache_lock:
+        cached = _extraction_cache.get(key)
+        if cached is not None:
+            _extraction_cache.move_to_end(key)
+            return cached
+
+    elements = extract_security_elements(html_content)
+    with _extraction_cache_lock:
+        _extraction_cache[key] = elements
+        if len(_extraction_cache) > EXTRACTION_CACHE_SIZE:
+            _extraction_cache.popitem(last=False)
+    return elements
+
 class FullSecurityAnalysis(BaseModel):
     visual: VisualSecurityCheck
     html: HtmlSecurityCheck
     price: PriceSecurityCheck
 
+# --- Prompt Constants ---
+
+NO_IFRAMES_SECTION = "=== IFRAMES ===\nNo iframes detected.\n\n"
+NO_FORMS_SECTION = "=== FORMS ===\nNo forms detected.\n\n"
+NO_PRICE_SECTION = "=== PRICE/PRODUCT CONTEXT ===\nNo price information detected.\n\n"
+
+SECURITY_ANALYSIS_INSTRUCTIONS = (
+    "Perform a comprehensive security analysis covering:\n"
+    "1. Visual Phishing (Logo/Layout mimicry)\n"
+    "2. Purchase Validation (Visible 'Buy' buttons)\n"
+    "3. HTML Risks (Iframes/CSRF)\n"
+    "4. Price Logic (Too good to be true scams)\n\n"
+    "If no screenshot is provided, set visual fields to False/Safe."
+)
+
+SECURITY_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "You are an elite e-commerce security expert. Perform a multi-modal analysis of this webpage. "
+        "Analyze Visuals, HTML structure, and Pricing logic simultaneously to detect scams, phishing, or vulnerabilities. "
+        "IMPORTANT: All reasoning/explanation fields MUST be written IN SPANISH. "
+        "Respond ONLY with valid JSON matching the schema. No explanations outside the JSON."
+    )
+}
+
 # --- Check Functions ---
 
 async def check_full_security(
@@ -151,31 +384,13 @@ async def check_full_security(
     content_parts = []
     
     # Text Analysis Content
-    text_content = f"Analyze webpage hosted at '{url}'.\n\n"
-    
-    if iframe_text.strip():
-        text_content += f"=== IFRAMES ===\n{iframe_text}\n\n"
-    else:
-        text_content += "=== IFRAMES ===\nNo iframes detected.\n\n"
-    
-    if form_text.strip():
-        text_content += f"=== FORMS ===\n{form_text}\n\n"
-    else:
-        text_content += "=== FORMS ===\nNo forms detected.\n\n"
-        
-    if price_context.strip():
-        text_content += f"=== PRICE/PRODUCT CONTEXT ===\n{price_context}\n\n"
-    else:
-        text_content += "=== PRICE/PRODUCT CONTEXT ===\nNo price information detected.\n\n"
-        
-    text_content += (
-        "Perform a comprehensive security analysis covering:\n"
-        "1. Visual Phishing (Logo/Layout mimicry)\n"
-        "2. Purchase Validation (Visible 'Buy' buttons)\n"
-        "3. HTML Risks (Iframes/CSRF)\n"
-        "4. Price Logic (Too good to be true scams)\n\n"
-        "If no screenshot is provided, set visual fields to False/Safe."
-    )
+    text_content = "".join([
+        f"Analyze webpage hosted at '{url}'.\n\n",
+        f"=== IFRAMES ===\n{iframe_text}\n\n" if iframe_text.strip() else NO_IFRAMES_SECTION,
+        f"=== FORMS ===\n{form_text}\n\n" if form_text.strip() else NO_FORMS_SECTION,
+        f"=== PRICE/PRODUCT CONTEXT ===\n{price_context}\n\n" if price_context.strip() else NO_PRICE_SECTION,
+        SECURITY_ANALYSIS_INSTRUCTIONS,
+    ])
     
     content_parts.append({"type": "text", "text": text_content})
     
@@ -185,21 +400,13 @@ async def check_full_security(
             "type": "image",
             "source": {
                 "type": "base64",
-                "media_type": "image/png",
+                "media_type": image_media_type(screenshot_base64),
                 "data": screenshot_base64
             }
         })
 
     messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are an elite e-commerce security expert. Perform a multi-modal analysis of this webpage. "
-                "Analyze Visuals, HTML structure, and Pricing logic simultaneously to detect scams, phishing, or vulnerabilities. "
-                "IMPORTANT: All reasoning/explanation fields MUST be written IN SPANISH. "
-                "Respond ONLY with valid JSON matching the schema. No explanations outside the JSON."
-            )
-        },
+        SECURITY_SYSTEM_MESSAGE,
         {
             "role": "user",
             "content": content_parts
@@ -221,7 +428,8 @@ async def ecommerce_guard_agent(request: AnalysisRequest):
     
     # 1. Prepare Data
     extract_start = time.time()
-    security_elements = extract_security_elements(request.html_content)
+    # Regex extraction is CPU-bound; keep it off the event loop
+    security_elements = await asyncio.to_thread(get_security_elements, request.html_content)
     logger.info(f"✓ HTML extraction ({time.time() - extract_start:.2f}s)")
     
     # 2. Single Combined Check
@@ -253,6 +461,9 @@ async def ecommerce_guard_agent(request: AnalysisRequest):
 
     logger.info(f"✓ Security checks complete ({time.time() - checks_start:.2f}s)")
 
+    # Flags below are built with model_construct (no validation): every type is a
+    # literal and every msg a str from a literal or an already-validated check result.
+    # Keep it that way; anything else must go through Flag(...).
     flags = []
     score_impact = 0
     
@@ -262,19 +473,19 @@ async def ecommerce_guard_agent(request: AnalysisRequest):
     if visual_res:
         # S1: Phishing
         if visual_res.phishing_detected:
-            flags.append(Flag(type="critical", msg=f"Posible Phishing detectado: {visual_res.phishing_reasoning}"))
+            flags.append(Flag.model_construct(type="critical", msg=f"Posible Phishing detectado: {visual_res.phishing_reasoning}"))
             score_impact += 100
         else:
-            flags.append(Flag(type="info", msg="No se detectó phishing visual obvio."))
+            flags.append(Flag.model_construct(type="info", msg="No se detectó phishing visual obvio."))
 
         # S4: Purchase Button
         if visual_res.purchase_button_present:
             purchase_active = True
-            flags.append(Flag(type="info", msg="Botón de compra detectado."))
+            flags.append(Flag.model_construct(type="info", msg="Botón de compra detectado."))
         else:
-            flags.append(Flag(type="warning", msg="No se detectó botón de compra activo."))
+            flags.append(Flag.model_construct(type="warning", msg="No se detectó botón de compra activo."))
     else:
-        flags.append(Flag(type="warning", msg="No se pudo realizar análisis visual (falta screenshot)."))
+        flags.append(Flag.model_construct(type="warning", msg="No se pudo realizar análisis visual (falta screenshot)."))
 
     # -- Process HTML Security Results (combined iframe + CSRF) --
     
@@ -282,28 +493,28 @@ async def ecommerce_guard_agent(request: AnalysisRequest):
     if html_res and html_res.iframe_risk_detected:
         severity = "critical" if purchase_active else "warning"
         impact = 20 if purchase_active else 10
-        flags.append(Flag(type=severity, msg=f"Riesgo de Iframe: {html_res.iframe_reasoning}"))
+        flags.append(Flag.model_construct(type=severity, msg=f"Riesgo de Iframe: {html_res.iframe_reasoning}"))
         score_impact += impact
     else:
-        flags.append(Flag(type="info", msg="Iframes seguros o ausentes."))
+        flags.append(Flag.model_construct(type="info", msg="Iframes seguros o ausentes."))
 
     # S3: CSRF
     if html_res and html_res.csrf_risk_detected:
         severity = "critical" if purchase_active else "warning"
         impact = 20 if purchase_active else 10
-        flags.append(Flag(type=severity, msg=f"Falta protección Anti-CSRF: {html_res.csrf_reasoning}"))
+        flags.append(Flag.model_construct(type=severity, msg=f"Falta protección Anti-CSRF: {html_res.csrf_reasoning}"))
         score_impact += impact
     else:
-        flags.append(Flag(type="info", msg="Formularios seguros o ausentes."))
+        flags.append(Flag.model_construct(type="info", msg="Formularios seguros o ausentes."))
 
     # -- Process Logic Results --
     
     # S5: Price Check
     if price_res and price_res.suspiciously_low_price:
-        flags.append(Flag(type="critical", msg=f"Precio sospechosamente bajo: {price_res.reasoning}"))
+        flags.append(Flag.model_construct(type="critical", msg=f"Precio sospechosamente bajo: {price_res.reasoning}"))
         score_impact += 40
     elif price_res:
-         flags.append(Flag(type="info", msg=f"Análisis de precio: {price_res.reasoning}"))
+         flags.append(Flag.model_construct(type="info", msg=f"Análisis de precio: {price_res.reasoning}"))
 
     total_time = time.time() - start_time
     logger.info(f"✓ Guard analysis complete: {len(flags)} flags, score_impact={score_impact} ({total_time:.2f}s)")
@@ -1,20 +1,64 @@
 import asyncio
-import os
+import hashlib
 import re
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Dict, Any, List, Optional, Tuple
-from urllib.parse import urlparse
 
 from pydantic import BaseModel, Field
-from tavily import TavilyClient
-
 from schemas import AnalysisRequest, Flag
-from llm import call_llm, call_structured_llm
+from llm import call_structured_llm
+from tavily_client import get_tavily_client, cached_search
 
 # Enable logging
 import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Compiled once at import; these run for every Tavily result.
+PRICE_FALLBACK_RE = re.compile(r'(?:\$|CLP)\s?((?>\d{1,3}(?:[.,]\d{3})+))')
+PRICE_SEP_TABLE = str.maketrans('', '', '.,')
+PRICE_TOKEN_RE = re.compile(r'(?:\$|CLP)\s?\d')
+CURRENCY_STRIP_RE = re.compile(r'[\$CLP\s]')
+THOUSANDS_SEP_RE = re.compile(r'[.,](?=\d{3})')
+
+# Common price patterns in Chilean e-commerce, tried in order
+HTML_PRICE_PATTERNS = tuple(re.compile(p) for p in (
+    # JSON-LD structured data
+    r'"price":\s*"?(\d{1,3}(?:[.,]\d{3})*)"?',
+    # Meta tags
+    r'content="(\d{1,3}(?:[.,]\d{3})*)"[^>]*property="product:price:amount"',
+    # Common price formats with currency
+    r'[\$](\d{1,3}(?:\.\d{3})+)',
+    r'CLP\s*(\d{1,3}(?:\.\d{3})+)',
+    # Price in data attributes
+    r'data-price="(\d+)"',
+))
+# Each pattern searches the page head (meta, JSON-LD) first and the rest of the page
+# only if the head has no match; patterns still run in priority order.
+# None of the patterns can match across a '>', so the head is cut at the first '>'
+# after HTML_HEAD_CHARS and no match is split between the two searches.
+HTML_HEAD_CHARS = 384 * 1024
+
+# Chilean prices use dots as thousands separators
+THOUSANDS_TO_DOTS = str.maketrans(',', '.')
+
+# Second-level labels under which the store name sits one label deeper (falabella.com.ar)
+GENERIC_SLDS = {"com", "co", "net", "org", "gob", "edu"}
+
+# Long search results are cut down to the text around the first prices
+CONTENT_LIMIT = 1500
+PRICE_WINDOW = 150
+MAX_PRICE_WINDOWS = 5
+
+# Reliable LLM extractions, so repeat lookups of the same product skip the LLM
+# Key: blake2b digest of (product name, title, windowed content)
+# Value: (expires_at, extracted price dict)
+_price_cache: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+PRICE_CACHE_SIZE = 2048
+PRICE_CACHE_TTL = 3600  # seconds; store prices change
+
 
 class ExtractedPrice(BaseModel):
     """Structured response for price extraction from search result content."""
@@ -38,22 +82,92 @@ class ExtractedPrice(BaseModel):
     )
 
 
-async def extract_price_with_llm(content: str, title: str, product_name: str) -> Optional[dict]:
+def _price_windows(content: str) -> str:
+    """
+    Returns content unchanged if short, otherwise the text surrounding the first
+    few price mentions (so sale vs. crossed-out prices keep their context).
+    """
+    if len(content) <= CONTENT_LIMIT:
+        return content
+
+    spans = []
+    for match in PRICE_TOKEN_RE.finditer(content):
+        start = max(0, match.start() - PRICE_WINDOW)
+        end = match.end() + PRICE_WINDOW
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = end
+        elif len(spans) == MAX_PRICE_WINDOWS:
+            break
+        else:
+            spans.append([start, end])
+
+    if not spans:
+        return content[:CONTENT_LIMIT]
+    return " ... ".join(content[start:end] for start, end in spans)[:CONTENT_LIMIT]
+
+
+class BatchExtractedPrice(ExtractedPrice):
+    """Price extracted for one numbered search result in a batch."""
+    index: int = Field(..., description="The RESULT number this price was extracted from")
+
+
+class ExtractedPriceBatch(BaseModel):
+    """Structured response for price extraction over several search results at once."""
+    items: List[BatchExtractedPrice] = Field(
+        default_factory=list,
+        description="One entry per RESULT, in the same order"
+    )
+
+
+# Output budget of a batched price extraction. Items are ~40 tokens of compact JSON;
+# the rest is headroom, since a truncated array loses the whole batch
+PRICE_BATCH_TOKENS_PER_ITEM = 120
+PRICE_BATCH_MIN_TOKENS = 100
+
+
+async def extract_prices_batch(results: List[Tuple[str, str]], product_name: str) -> List[Optional[dict]]:
     """
-    Use LLM to intelligently extract the CURRENT price from search result content.
+    Use LLM to intelligently extract the CURRENT price from several search results
+    in a single call. `results` holds (content, title) pairs; the returned list is
+    aligned with it and holds None where no reliable price was found.
 
     This avoids common pitfalls like:
     - Extracting crossed-out/original prices instead of sale prices
     - Extracting installment amounts instead of full prices
     - Extracting shipping costs or other unrelated prices
     """
-    # Truncate content if too long
-    content_truncated = content[:1500] if len(content) > 1500 else content
+    extracted: List[Optional[dict]] = [None] * len(results)
+    if not results:
+        return extracted
+
+    # Truncate content if too long, keeping the text around prices
+    windows = [(_price_windows(content), title) for content, title in results]
+
+    # Serve cached extractions; only the rest go to the LLM
+    now = time.monotonic()
+    keys = []
+    pending = []
+    for i, (window, title) in enumerate(windows):
+        key = hashlib.blake2b(f"{product_name}|{title}|{window}".encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        keys.append(key)
+        cached = _price_cache.get(key)
+        if cached and cached[0] > now:
+            _price_cache.move_to_end(key)
+            extracted[i] = cached[1]
+        else:
+            pending.append(i)
+    if not pending:
+        return extracted
+
+    results_text = "\n\n".join(
+        f"RESULT {n}:\nTitle: {windows[i][1]}\nPage content:\n{windows[i][0]}\n---"
+        for n, i in enumerate(pending)
+    )
 
     messages = [
         {
             "role": "system",
-            "content": """You are a price extraction expert. Extract the CURRENT/SALE price from e-commerce text.
+            "content": """You are a price extraction expert. Extract the CURRENT/SALE price from each e-commerce text.
 
 RULES:
 1. Extract the CURRENT price, NOT the original/crossed-out price
@@ -62,6 +176,7 @@ RULES:
 4. If discount shown (X% OFF), the current price is the LOWER one
 5. Return price as integer without separators
 6. If uncertain, set current_price to null
+7. Return exactly one item per RESULT, with its RESULT number as index
 
 IMPORTANT: Respond ONLY with valid JSON. No explanations, no text before or after the JSON."""
         },
@@ -69,27 +184,45 @@ IMPORTANT: Respond ONLY with valid JSON. No explanations, no text before or afte
             "role": "user",
             "content": f"""Product: {product_name}
 
-Title: {title}
-
-Page content:
-{content_truncated}
+{results_text}
 
-Extract the CURRENT price (not original, not installments)."""
+Extract the CURRENT price (not original, not installments) for every RESULT."""
         }
     ]
 
     try:
-        result = await call_structured_llm(messages, ExtractedPrice, max_tokens=200)
-        if result and result.current_price and result.confidence >= 50 and not result.is_installment:
-            return {
-                "price": result.current_price,
-                "currency": result.currency,
-                "confidence": result.confidence
-            }
-        return None
+        # Haiku is enough for reading prices out of short snippets; Sonnet stays on the security check
+        batch = await call_structured_llm(
+            messages,
+            ExtractedPriceBatch,
+            model="claude-3-5-haiku-20241022",
+            max_tokens=PRICE_BATCH_TOKENS_PER_ITEM * len(pending) + PRICE_BATCH_MIN_TOKENS
+        )
+        if not batch:
+            logger.warning(
+                f"[PRICE AGENT] Batched price extraction returned no parsable result; "
+                f"{len(pending)} results fall back to regex"
+            )
+            return extracted
+        for item in batch.items:
+            if not 0 <= item.index < len(pending):
+                continue
+            # Only reliable extractions are returned (and cached)
+            if item.current_price and item.confidence >= 50 and not item.is_installment:
+                i = pending[item.index]
+                extracted[i] = {
+                    "price": item.current_price,
+                    "currency": item.currency,
+                    "confidence": item.confidence
+                }
+                _price_cache[keys[i]] = (now + PRICE_CACHE_TTL, extracted[i])
+                _price_cache.move_to_end(keys[i])
+                if len(_price_cache) > PRICE_CACHE_SIZE:
+                    _price_cache.popitem(last=False)
+        return extracted
     except Exception as e:
-        logger.warning(f"[PRICE AGENT] LLM price extraction failed: {e}")
-        return None
+        logger.warning(f"[PRICE AGENT] LLM price extraction failed, {len(pending)} results fall back to regex: {e}")
+        return extracted
 
 
 def extract_price_regex_fallback(content: str) -> Optional[int]:
@@ -99,33 +232,15 @@ def extract_price_regex_fallback(content: str) -> Optional[int]:
     """
     # Find all Chilean peso prices in the content
     # Matches: $XX.XXX.XXX or $XX,XXX,XXX or CLP XX.XXX.XXX
-    price_matches = re.findall(r'[\$|CLP]\s?(\d{1,3}(?:[.,]\d{3})+)', content)
-
-    if not price_matches:
-        return None
-
-    # Convert all prices to integers
-    prices = []
-    for match in price_matches:
-        # Remove dots and commas, convert to int
-        cleaned = re.sub(r'[.,]', '', match)
-        try:
-            prices.append(int(cleaned))
-        except ValueError:
-            continue
-
-    if not prices:
-        return None
+    # Matches are digits and separators only, so dropping dots and commas always leaves an int
+    prices = (int(match.translate(PRICE_SEP_TABLE)) for match in PRICE_FALLBACK_RE.findall(content))
 
     # Heuristic: Filter out likely installment prices (typically under 50,000 CLP for electronics)
-    # and return a middle-range price (not the highest which might be original, not the lowest which might be installment)
-    reasonable_prices = [p for p in prices if p >= 50000]  # Filter likely installments
+    # and return the minimum of the rest (most likely the sale price, not the original)
+    # If all prices seem like installments, return None
+    return min((p for p in prices if p >= 50000), default=None)
 
-    if reasonable_prices:
-        # Return the minimum of reasonable prices (most likely the sale price)
-        return min(reasonable_prices)
 
-    # If all prices seem like installments, return None
 def parse_price(price_str: str) -> Optional[int]:
     """
     Parse a price string and return the numeric value.
@@ -135,9 +250,9 @@ def parse_price(price_str: str) -> Optional[int]:
         return None
 
     # Remove currency symbols and whitespace
-    cleaned = re.sub(r'[\$CLP\s]', '', price_str)
+    cleaned = CURRENCY_STRIP_RE.sub('', price_str)
     # Remove thousand separators (dots or commas)
-    cleaned = re.sub(r'[.,](?=\d{3})', '', cleaned)
+    cleaned = THOUSANDS_SEP_RE.sub('', cleaned)
 
     try:
         return int(cleaned)
@@ -153,22 +268,12 @@ def extract_price_from_html(html_content: str) -> Optional[Tuple[str, int]]:
     if not html_content:
         return None
 
-    # Common price patterns in Chilean e-commerce
     # Look for prices in common price containers
-    price_patterns = [
-        # JSON-LD structured data
-        r'"price":\s*"?(\d{1,3}(?:[.,]\d{3})*)"?',
-        # Meta tags
-        r'content="(\d{1,3}(?:[.,]\d{3})*)"[^>]*property="product:price:amount"',
-        # Common price formats with currency
-        r'[\$](\d{1,3}(?:\.\d{3})+)',
-        r'CLP\s*(\d{1,3}(?:\.\d{3})+)',
-        # Price in data attributes
-        r'data-price="(\d+)"',
-    ]
-
-    for pattern in price_patterns:
-        match = re.search(pattern, html_content)
+    head_end = html_content.find('>', HTML_HEAD_CHARS) + 1 or len(html_content)
+    for pattern in HTML_PRICE_PATTERNS:
+        match = pattern.search(html_content, 0, head_end)
+        if not match and head_end < len(html_content):
+            match = pattern.search(html_content, head_end)
         if match:
             price_str = match.group(1)
             price_val = parse_price(price_str)
@@ -178,25 +283,52 @@ def extract_price_from_html(html_content: str) -> Optional[Tuple[str, int]]:
     return None
 
 
+# Common separators in e-commerce titles, in priority order
+TITLE_SEPARATORS = (' | ', ' - ', ' – ', ' — ')
+
+
+@lru_cache(maxsize=512)
+def _clean_title(title: str) -> str:
+    """Takes the part before the highest-priority separator as the product name."""
+    for sep in TITLE_SEPARATORS:
+        if sep in title:
+            return title.split(sep, 1)[0].strip()
+    return title
+
+
+def _format_clp(value: int) -> str:
+    """Formats a price with Chilean separators, e.g. 1029990 -> '$1.029.990'."""
+    return f"${value:,.0f}".translate(THOUSANDS_TO_DOTS)
+
+
+def _host(url: str) -> str:
+    """Host part of a URL without 'www.', sliced directly instead of a full urlparse."""
+    start = url.find('://')
+    start = 0 if start < 0 else start + 3
+    end = len(url)
+    for delim in '/?#':
+        pos = url.find(delim, start, end)
+        if pos >= 0:
+            end = pos
+    host = url[start:end]
+    return host[4:] if host.startswith('www.') else host
+
+
+def _base_domain(domain: str) -> str:
+    """Reduces a host to its registrable domain so store subdomains count once."""
+    labels = domain.split('.')
+    if len(labels) >= 3 and labels[-2] in GENERIC_SLDS:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
 def extract_product_name(request: AnalysisRequest) -> str:
     """
     Try to extract a product name from the request data.
     Priority: Title cleaned up
     """
     if request.title:
-        # Common separators in e-commerce titles
-        separators = [' | ', ' - ', ' – ', ' — ']
-        title = request.title
-        
-        # Try to take the first part as the product name
-        for sep in separators:
-            if sep in title:
-                parts = title.split(sep)
-                if len(parts) >= 1:
-                    title = parts[0].strip()
-                    break
-        
-        return title
+        return _clean_title(request.title)
     
     return ""
 
@@ -212,8 +344,7 @@ async def price_comparison_agent(request: AnalysisRequest) -> Dict[str, Any]:
     """
     logger.info("💰 [PRICE AGENT] Starting price comparison analysis...")
 
-    tavily_api_key = os.getenv("TAVILY_API_KEY")
-    if not tavily_api_key:
+    if not get_tavily_client():
         logger.warning("⚠️ [PRICE AGENT] No TAVILY_API_KEY found, skipping price comparison")
         return {
             "flags": [],
@@ -222,7 +353,6 @@ async def price_comparison_agent(request: AnalysisRequest) -> Dict[str, Any]:
         }
 
     try:
-        client = TavilyClient(api_key=tavily_api_key)
         product_name = extract_product_name(request)
         
         if not product_name or len(product_name) < 3:
@@ -238,11 +368,14 @@ async def price_comparison_agent(request: AnalysisRequest) -> Dict[str, Any]:
         # Search query - focused on Chile and international stores that ship to Chile
         query = f'comprar "{product_name}" precio Chile'
         
-        response = client.search(
-            query=query,
-            search_depth="advanced",
-            max_results=20,  # Increased to get more options to filter
-            include_answer=True
+        # Scan the current page for its own price while the search is in flight
+        response, current_price_data = await asyncio.gather(
+            cached_search(
+                query=query,
+                search_depth="advanced",
+                max_results=20  # Increased to get more options to filter
+            ),
+            asyncio.to_thread(extract_price_from_html, request.html_content)
         )
 
         found_prices = []
@@ -252,52 +385,64 @@ async def price_comparison_agent(request: AnalysisRequest) -> Dict[str, Any]:
         # This is a heuristic approach since we don't have structured product data from Tavily
         # We'll look for price patterns in the content snippets
         
-        current_domain = urlparse(request.url).netloc.replace("www.", "")
+        current_domain = _host(request.url)
         
         # Collect results first, then process prices with LLM in parallel
         results_to_process = []
 
         for result in response.get("results", []):
             url = result.get("url", "")
-            domain = urlparse(url).netloc.replace("www.", "")
+            domain = _host(url)
 
             # Skip the current site
             if current_domain in domain or domain in current_domain:
                 continue
 
-            # Skip if we already found a price for this domain
-            if domain in seen_domains:
+            # Skip if we already found a price for this store (any subdomain)
+            base_domain = _base_domain(domain)
+            if base_domain in seen_domains:
                 continue
 
             content = result.get("content", "")
             title = result.get("title", "")
 
             # Only process if there's some price-like content
-            if re.search(r'[\$|CLP]\s?\d', content):
+            if '$' not in content and 'CLP' not in content:
+                continue
+            price_mentions = sum(1 for _ in PRICE_TOKEN_RE.finditer(content))
+            if price_mentions:
                 results_to_process.append({
                     "url": url,
                     "domain": domain,
                     "content": content,
-                    "title": title
+                    "title": title,
+                    "price_mentions": price_mentions
                 })
-                seen_domains.add(domain)
+                seen_domains.add(base_domain)
+
+        # Price-dense snippets give the most reliable extractions; the stable
+        # sort keeps Tavily's relevance order among ties
+        results_to_process.sort(key=lambda r: r["price_mentions"], reverse=True)
 
         logger.info(f"🔍 [PRICE AGENT] Processing {len(results_to_process)} results for price extraction...")
 
         # Process prices using LLM for accurate extraction
-        # Limit to first 5 results to avoid too many LLM calls
-        async def process_single_result(result_data: dict) -> Optional[dict]:
-            """Process a single search result to extract price."""
+        # Limit to first 5 results, all sent in a single LLM call
+        results_to_process = results_to_process[:5]
+        llm_results = await extract_prices_batch(
+            [(r["content"], r["title"]) for r in results_to_process],
+            product_name
+        )
+
+        def process_single_result(result_data: dict, llm_result: Optional[dict]) -> Optional[dict]:
+            """Build the price entry for a single search result."""
             content = result_data["content"]
             title = result_data["title"]
 
-            # Try LLM extraction first for accuracy
-            llm_result = await extract_price_with_llm(content, title, product_name)
-
             if llm_result and llm_result.get("price"):
                 price_value = llm_result["price"]
                 # Format price with Chilean thousands separator
-                price_formatted = f"${price_value:,.0f}".replace(",", ".")
+                price_formatted = _format_clp(price_value)
                 return {
                     "store": result_data["domain"],
                     "title": title,
@@ -311,7 +456,7 @@ async def price_comparison_agent(request: AnalysisRequest) -> Dict[str, Any]:
             # Fallback to regex if LLM fails
             regex_price = extract_price_regex_fallback(content)
             if regex_price:
-                price_formatted = f"${regex_price:,.0f}".replace(",", ".")
+                price_formatted = _format_clp(regex_price)
                 return {
                     "store": result_data["domain"],
                     "title": title,
@@ -324,12 +469,9 @@ async def price_comparison_agent(request: AnalysisRequest) -> Dict[str, Any]:
 
             return None
 
-        # Process up to 5 results in parallel
-        tasks = [process_single_result(r) for r in results_to_process[:5]]
-        extraction_results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for result in extraction_results:
-            if isinstance(result, dict) and result:
+        for result_data, llm_result in zip(results_to_process, llm_results):
+            result = process_single_result(result_data, llm_result)
+            if result:
                 found_prices.append(result)
 
         logger.info(f"✅ [PRICE AGENT] Found {len(found_prices)} potential price comparisons")
@@ -339,18 +481,13 @@ async def price_comparison_agent(request: AnalysisRequest) -> Dict[str, Any]:
         price_verdict = None
         price_verdict_detail = None
 
-        # Try to extract current site's price
-        current_price_data = extract_price_from_html(request.html_content)
+        # Current site's price (extracted alongside the search)
         current_price = current_price_data[1] if current_price_data else None
         current_price_str = current_price_data[0] if current_price_data else None
 
         if found_prices and current_price:
-            # Parse competitor prices and compare
-            competitor_prices = []
-            for fp in found_prices:
-                parsed = parse_price(fp["price_text"])
-                if parsed:
-                    competitor_prices.append(parsed)
+            # Compare against competitor prices (already numeric, no need to re-parse price_text)
+            competitor_prices = [fp["price_numeric"] for fp in found_prices if fp.get("price_numeric")]
 
             if competitor_prices:
                 avg_price = sum(competitor_prices) / len(competitor_prices)
@@ -369,7 +506,7 @@ async def price_comparison_agent(request: AnalysisRequest) -> Dict[str, Any]:
                     price_verdict_detail = f"Este precio ({current_price_str}) está por sobre el promedio. Encontramos opciones más baratas."
                     flags.append(Flag(
                         type="warning",
-                        msg=f"⚠️ Precio alto: encontramos el mismo producto desde ${min_price:,}".replace(",", ".")
+                        msg=f"⚠️ Precio alto: encontramos el mismo producto desde {_format_clp(min_price)}"
                     ))
 
                 logger.info(f"💰 [PRICE AGENT] Verdict: {price_verdict} (current: {current_price}, avg: {avg_price:.0f}, min: {min_price})")
@@ -1,29 +1,49 @@
 import asyncio
-import os
+import json
 import re
 import time
-from typing import Dict, Any, List
-from urllib.parse import urlparse
-
-from tavily import TavilyClient
+from collections import OrderedDict
+from itertools import chain
+from typing import Dict, Any, List, Tuple
+from urllib.parse import urlsplit
 
 from schemas import AnalysisRequest, Flag
 from llm import call_llm
+from tavily_client import get_tavily_client, cached_search
 
 # Enable logging
 import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Common separators in e-commerce titles
+TITLE_SEPARATORS = (' | ', ' - ', ' – ', ' — ')
+# Country/store words trailing a brand name ("Falabella Chile", "Paris Tienda Online")
+BRAND_SUFFIX_RE = re.compile(r'\s*(Chile|México|Argentina|España|Colombia|Online|Store|Shop|Tienda).*$', re.IGNORECASE)
+RATING_RE = re.compile(r'(\d[.,]\d)\s*(?:out of 5|/5|stars|estrellas|-star)', re.IGNORECASE)
+
+# TLDs of same-named sites that are NOT the analyzed store (salomon.com vs salomon.cl)
+GOOGLE_OTHER_TLDS = ('.com', '.net', '.org', '.es', '.mx', '.ar')
+OTHER_TLDS = GOOGLE_OTHER_TLDS + ('.co', '.us', '.uk')
+
+# Final results per (domain, business name); the same store is usually analyzed
+# several times in a session and its reputation doesn't change within minutes
+# Value: (expires_at, result)
+_result_cache: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL = 900  # seconds
+
+
+def _substring_re(needles: Tuple[str, ...]) -> "re.Pattern[str]":
+    """Compiles literal needles into one pattern that matches wherever any of them occurs."""
+    return re.compile("|".join(map(re.escape, needles)))
+
 
 def extract_domain(url: str) -> str:
     """Extract the domain name from a URL."""
-    parsed = urlparse(url)
-    domain = parsed.netloc or parsed.path
+    parts = urlsplit(url)
     # Remove www. prefix if present
-    if domain.startswith("www."):
-        domain = domain[4:]
-    return domain
+    return (parts.netloc or parts.path).removeprefix("www.")
 
 
 def extract_business_name(request: AnalysisRequest) -> str:
@@ -35,13 +55,12 @@ def extract_business_name(request: AnalysisRequest) -> str:
     domain_name = domain.split('.')[0]
 
     if request.title:
-        separators = [' | ', ' - ', ' – ', ' — ']
-        for sep in separators:
+        for sep in TITLE_SEPARATORS:
             if sep in request.title:
                 parts = request.title.split(sep)
                 if len(parts) >= 2:
                     brand = parts[-1].strip()
-                    brand = re.sub(r'\s*(Chile|México|Argentina|España|Colombia|Online|Store|Shop|Tienda).*$', '', brand, flags=re.IGNORECASE).strip()
+                    brand = BRAND_SUFFIX_RE.sub('', brand).strip()
                     if brand and len(brand) > 2:
                         return brand
 
@@ -61,9 +80,7 @@ async def reviews_agent(request: AnalysisRequest) -> Dict[str, Any]:
     start_time = time.time()
     logger.info("🔍 [REVIEWS] Starting analysis...")
 
-    tavily_api_key = os.getenv("TAVILY_API_KEY")
-
-    if not tavily_api_key:
+    if not get_tavily_client():
         return {
             "flags": [Flag(type="info", msg="Review search skipped (TAVILY_API_KEY not configured)")],
             "details": {"reviews_checked": False, "reason": "API key not configured"},
@@ -71,14 +88,28 @@ async def reviews_agent(request: AnalysisRequest) -> Dict[str, Any]:
         }
 
     try:
-        client = TavilyClient(api_key=tavily_api_key)
-
         domain = extract_domain(request.url)
         business_name = extract_business_name(request)
 
+        cache_key = (domain, business_name)
+        cached = _result_cache.get(cache_key)
+        if cached and cached[0] > time.monotonic():
+            _result_cache.move_to_end(cache_key)
+            logger.info(f"⚡ Reviews served from cache for {domain}")
+            return cached[1]
+
         # Get base domain for filtering (e.g., "salomon" from "salomon.cl")
         domain_base = domain.split('.')[0]
         domain_tld = '.' + domain.split('.')[-1]
+        domain_lower = domain.lower()
+
+        # Same-named sites on other TLDs, built once for all result filters below.
+        # Each list is compiled into one alternation so a result is scanned once, not once per TLD
+        google_wrong_domains = tuple(f"{domain_base}{tld}" for tld in GOOGLE_OTHER_TLDS if tld != domain_tld)
+        wrong_domains = tuple(f"{domain_base}{tld}" for tld in OTHER_TLDS if tld != domain_tld)
+        google_wrong_domain_re = _substring_re(google_wrong_domains)
+        wrong_domain_re = _substring_re(wrong_domains)
+        wrong_review_title_re = _substring_re(tuple(f"reviews of {wrong}" for wrong in wrong_domains))
 
         # ============================================
         # PARALLEL SEARCHES: Google, Trustpilot, and General
@@ -89,13 +120,12 @@ async def reviews_agent(request: AnalysisRequest) -> Dict[str, Any]:
         async def search_google():
             try:
                 google_query = f'site:google.com/maps "{business_name}" OR "{domain}" reviews'
-                return await asyncio.to_thread(
-                    client.search,
+                return await cached_search(
                     query=google_query,
-                search_depth="advanced",
-                max_results=5,
-                include_answer=True
-            )
+                    search_depth="advanced",
+                    max_results=5,
+                    include_answer=True
+                )
             except Exception as e:
                 logger.error(f"✗ Google search failed: {str(e)}")
                 return None
@@ -103,12 +133,10 @@ async def reviews_agent(request: AnalysisRequest) -> Dict[str, Any]:
         async def search_trustpilot():
             try:
                 tp_query = f'site:trustpilot.com "{domain}"'
-                return await asyncio.to_thread(
-                    client.search,
+                return await cached_search(
                     query=tp_query,
                     search_depth="advanced",
-                    max_results=5,
-                    include_answer=True
+                    max_results=5
                 )
             except Exception as e:
                 logger.error(f"✗ Trustpilot search failed: {str(e)}")
@@ -117,12 +145,10 @@ async def reviews_agent(request: AnalysisRequest) -> Dict[str, Any]:
         async def search_general():
             try:
                 review_query = f'"{domain}" opiniones reseñas experiencia compra -"{domain_base}.com"'
-                return await asyncio.to_thread(
-                    client.search,
+                return await cached_search(
                     query=review_query,
                     search_depth="advanced",
-                    max_results=5,
-                    include_answer=True
+                    max_results=5
                 )
             except Exception as e:
                 logger.error(f"✗ General search failed: {str(e)}")
@@ -160,15 +186,7 @@ async def reviews_agent(request: AnalysisRequest) -> Dict[str, Any]:
                 content_lower = content.lower()
 
                 # Skip if it mentions .com version when we're analyzing .cl (or vice versa)
-                other_tlds = ['.com', '.net', '.org', '.es', '.mx', '.ar']
-
-                is_wrong_domain = False
-                for tld in other_tlds:
-                    if tld != domain_tld and f"{domain_base}{tld}" in content_lower:
-                        is_wrong_domain = True
-                        break
-
-                if is_wrong_domain:
+                if google_wrong_domain_re.search(content_lower):
                     continue
 
                 # Skip support/help pages - we want actual reviews
@@ -209,32 +227,25 @@ async def reviews_agent(request: AnalysisRequest) -> Dict[str, Any]:
                 if "trustpilot.com" not in url:
                     continue
 
-                url_has_exact_domain = domain.lower() in url
+                url_has_exact_domain = domain_lower in url
                 content_lower = (content + " " + title).lower()
-                other_tlds = ['.com', '.net', '.org', '.es', '.mx', '.ar', '.co', '.us', '.uk']
-
-                is_wrong_domain = False
-                for tld in other_tlds:
-                    if tld != domain_tld:
-                        wrong_domain = f"{domain_base}{tld}"
-                        if wrong_domain in url and domain.lower() not in url:
-                            is_wrong_domain = True
-                            break
-                        if f"reviews of {wrong_domain}" in content_lower or f"review/{wrong_domain}" in url:
-                            if domain.lower() not in url:
-                                is_wrong_domain = True
-                                break
-
-                if is_wrong_domain:
+
+                # Trustpilot page for a same-named site on another TLD
+                if not url_has_exact_domain and (
+                    wrong_domain_re.search(url)
+                    or wrong_review_title_re.search(content_lower)
+                ):
                     continue
 
-                if url_has_exact_domain or domain.lower() in content_lower:
+                if url_has_exact_domain or domain_lower in content_lower:
                     if not trustpilot_url or url_has_exact_domain:
                         trustpilot_url = result.get("url", "")
 
-                    rating_match = re.search(r'(\d[.,]\d)\s*(out of 5|/5|stars|estrellas|-star)', content, re.IGNORECASE)
-                    if rating_match and not trustpilot_rating:
-                        trustpilot_rating = rating_match.group(1).replace(',', '.')
+                    # First rating found wins; later results don't need scanning
+                    if not trustpilot_rating:
+                        rating_match = RATING_RE.search(content)
+                        if rating_match:
+                            trustpilot_rating = rating_match.group(1).replace(',', '.')
 
                     if content and len(content) > 50:
                         trustpilot_reviews.append({
@@ -261,17 +272,8 @@ async def reviews_agent(request: AnalysisRequest) -> Dict[str, Any]:
                     continue
 
                 content_lower = (content + " " + title).lower()
-                other_tlds = ['.com', '.net', '.org', '.es', '.mx', '.ar', '.co', '.us', '.uk']
-
-                is_wrong_domain = False
-                for tld in other_tlds:
-                    if tld != domain_tld:
-                        wrong_domain = f"{domain_base}{tld}"
-                        if wrong_domain in content_lower and domain.lower() not in content_lower:
-                            is_wrong_domain = True
-                            break
 
-                if is_wrong_domain:
+                if domain_lower not in content_lower and wrong_domain_re.search(content_lower):
                     continue
 
                 source = "Web"
@@ -297,21 +299,12 @@ async def reviews_agent(request: AnalysisRequest) -> Dict[str, Any]:
         # ============================================
         # STEP 4: Combine and limit reviews (mix Google, Trustpilot, and general)
         # ============================================
-        all_reviews = []
-        all_reviews.extend(trustpilot_reviews)
-        all_reviews.extend(google_reviews)
-        all_reviews.extend(general_reviews)
-
-        # Remove duplicates based on URL
-        seen_urls = set()
-        unique_reviews = []
-        for review in all_reviews:
-            url = review.get("url", "").lower()
-            if url not in seen_urls:
-                seen_urls.add(url)
-                unique_reviews.append(review)
-
-        all_reviews = unique_reviews
+        # Remove duplicates based on URL, keeping the first occurrence in source order
+        unique_reviews: Dict[str, Dict[str, Any]] = {}
+        for review in chain(trustpilot_reviews, google_reviews, general_reviews):
+            unique_reviews.setdefault(review.get("url", "").lower(), review)
+
+        all_reviews = list(unique_reviews.values())
         display_reviews = all_reviews[:5]
 
         # ============================================
@@ -353,7 +346,6 @@ Responde SOLO con el JSON válido, sin markdown."""
                 )
 
                 if summary_response:
-                    import json
                     try:
                         json_str = summary_response.strip()
                         if json_str.startswith("```json"):
@@ -450,7 +442,7 @@ Responde SOLO con el JSON válido, sin markdown."""
         total_time = time.time() - start_time
         logger.info(f"✓ Reviews analysis complete: {len(all_reviews)} reviews, score_impact={score_impact} ({total_time:.2f}s)")
 
-        return {
+        result = {
             "flags": flags,
             "details": {
                 "reviews_checked": True,
@@ -470,6 +462,16 @@ Responde SOLO con el JSON válido, sin markdown."""
             "score_impact": score_impact
         }
 
+        # Only cache complete analyses, so a failed search or summary is retried next time
+        searches_ok = google_response is not None and tp_response is not None and review_response is not None
+        if searches_ok and (review_summary is not None or len(all_reviews) < 3):
+            _result_cache[cache_key] = (time.monotonic() + RESULT_CACHE_TTL, result)
+            _result_cache.move_to_end(cache_key)
+            if len(_result_cache) > RESULT_CACHE_SIZE:
+                _result_cache.popitem(last=False)
+
+        return result
+
     except Exception as e:
         logger.error(f"✗ Reviews agent failed: {str(e)}")
         return {
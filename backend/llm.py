@@ -1,30 +1,237 @@
 import os
+import re
 import json
+import time
 import asyncio
-from typing import List, Type, TypeVar, Optional
+import inspect
+import hashlib
+import logging
+import orjson
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type, TypeVar
 from pydantic import BaseModel
-from anthropic import AsyncAnthropic
+from anthropic import AsyncAnthropic, APIStatusError
+
+from singleflight import single_flight
+
+logger = logging.getLogger(__name__)
 
 # Initialize Anthropic client
 # Assumes ANTHROPIC_API_KEY is set in environment
 client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
-# Semaphore to limit concurrent API calls and avoid rate limiting
-# Max 3 concurrent requests to Anthropic API (conservatively set to avoid 429s)
-_api_semaphore = asyncio.Semaphore(4)
 
-# Simple in-memory cache to avoid redundant calls
+async def close_llm_client() -> None:
+    """Releases the shared Anthropic client's connection pool (called on app shutdown)."""
+    await client.close()
+
+# --- Adaptive concurrency limit for Anthropic calls ---
+
+class AIMDLimiter:
+    """
+    Concurrency cap that adapts to Anthropic's rate limits (additive increase,
+    multiplicative decrease).
+
+    Each successful call raises the cap by one while the account still has request
+    headroom. A 429 or 5xx halves it and pauses new calls for the server's
+    retry-after, so the cap settles just below the point where requests get rejected.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, headroom: int):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.headroom = headroom
+        self._in_flight = 0
+        self._resume_at = 0.0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self) -> "AIMDLimiter":
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, headers) -> None:
+        remaining = headers.get("anthropic-ratelimit-requests-remaining")
+        if remaining is not None and remaining.isdigit() and int(remaining) <= self.headroom:
+            return
+        self.limit = min(self.maximum, self.limit + 1)
+
+    def on_overload(self, headers) -> None:
+        self.limit = max(self.minimum, self.limit // 2)
+        retry_after = headers.get("retry-after")
+        try:
+            delay = float(retry_after) if retry_after else 0.0
+        except ValueError:
+            delay = 0.0
+        if delay > 0:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+
+
+# Starts at the previous fixed limit of 4 concurrent requests and adapts from there
+_api_limiter = AIMDLimiter(initial=4, minimum=2, maximum=32, headroom=5)
+
+
+@asynccontextmanager
+async def _rate_limited():
+    """Holds a limiter slot for one API call and reports 429/5xx errors back to it."""
+    async with _api_limiter:
+        try:
+            yield
+        except APIStatusError as e:
+            if e.status_code == 429 or e.status_code >= 500:
+                _api_limiter.on_overload(e.response.headers)
+            raise
+
+
+# Leading base64 characters of each image format's magic bytes
+_IMAGE_SIGNATURES = (
+    ("/9j/", "image/jpeg"),
+    ("iVBORw0KGgo", "image/png"),
+    ("R0lGOD", "image/gif"),
+    ("UklGR", "image/webp"),
+)
+
+def image_media_type(data: str) -> str:
+    """Media type of a base64-encoded image, from its leading bytes (PNG if unrecognized)."""
+    for prefix, media_type in _IMAGE_SIGNATURES:
+        if data.startswith(prefix):
+            return media_type
+    return "image/png"
+
+
+def _split_system(messages: List[dict]) -> Tuple[Optional[str], List[dict]]:
+    """
+    Separates system messages (Anthropic takes them as a separate parameter) from the rest.
+    Returns the combined system prompt, or None if there is none, and the remaining messages.
+    """
+    system_messages = [msg["content"] for msg in messages if msg.get("role") == "system"]
+    user_messages = [msg for msg in messages if msg.get("role") != "system"]
+    return ("\n\n".join(system_messages) if system_messages else None), user_messages
+
+
+async def _create_message(**kwargs):
+    """
+    client.messages.create under the adaptive limiter, feeding the response's
+    rate-limit headers (or the error status) back into it.
+    """
+    async with _rate_limited():
+        raw = await client.messages.with_raw_response.create(**kwargs)
+        _api_limiter.on_success(raw.headers)
+        response = raw.parse()
+        # parse() is a coroutine on the async client in newer SDK versions
+        if inspect.isawaitable(response):
+            response = await response
+        return response
+
+# Simple in-memory LRU cache to avoid redundant calls
 # Key: hash of (model, str(messages), temperature, max_tokens)
 # Value: response content
-_response_cache = {}
+_response_cache: "OrderedDict[str, str]" = OrderedDict()
+RESPONSE_CACHE_SIZE = 512
 
 def _get_cache_key(messages: List[dict], model: str, temperature: float, max_tokens: int) -> str:
-    # Create a stable string representation of messages for hashing
-    msg_str = json.dumps(messages, sort_keys=True)
-    return f"{model}|{msg_str}|{temperature}|{max_tokens}"
+    # Create a stable byte representation of messages for hashing
+    # Only the digest is kept: messages can carry whole page extracts and screenshots
+    digest = hashlib.blake2b(orjson.dumps(messages, option=orjson.OPT_SORT_KEYS), digest_size=16)
+    digest.update(f"|{model}|{temperature}|{max_tokens}".encode())
+    return digest.hexdigest()
+
+def _cache_get(cache_key: str) -> Optional[str]:
+    value = _response_cache.get(cache_key)
+    if value is not None:
+        _response_cache.move_to_end(cache_key)
+    return value
+
+def _cache_set(cache_key: str, value: str) -> None:
+    _response_cache[cache_key] = value
+    _response_cache.move_to_end(cache_key)
+    if len(_response_cache) > RESPONSE_CACHE_SIZE:
+        _response_cache.popitem(last=False)
 
 T = TypeVar('T', bound=BaseModel)
 
+# Calls currently waiting on the API, by cache key. Identical concurrent calls (the
+# same page analyzed twice at once) await the first one instead of sending a duplicate
+# request. The future resolves to the response text (None if the call failed), or is
+# cancelled if the caller running it was
+_in_flight: "Dict[str, asyncio.Future[Optional[str]]]" = {}
+
+async def _single_flight(cache_key: str, fetch: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+    """Runs fetch for the first caller of a cache key; concurrent callers share its result."""
+    if cache_key in _in_flight:
+        logger.debug("⚡ Joining in-flight call")
+    return await single_flight(_in_flight, cache_key, fetch)
+
+# Markdown code fence around a model's JSON answer (```json ... ``` or ``` ... ```)
+_FENCE_RE = re.compile(r"\A```(?:json)?\s*|\s*```\Z")
+_json_decoder = json.JSONDecoder()
+
+# Prompt-cache token totals since startup, reported by the health endpoint
+_prompt_cache_usage: Dict[str, int] = {"cache_read_input_tokens": 0, "cache_creation_input_tokens": 0, "input_tokens": 0}
+
+def _record_prompt_cache_usage(usage: Any) -> None:
+    for field in _prompt_cache_usage:
+        _prompt_cache_usage[field] += getattr(usage, field, None) or 0
+
+def get_prompt_cache_usage() -> Dict[str, int]:
+    """Input token totals of structured calls: served from the prompt cache, written to it, and uncached."""
+    return dict(_prompt_cache_usage)
+
+def _cacheable_system(system_msg: str) -> List[dict]:
+    """
+    Wraps a static system prompt as a single block with a prompt-cache breakpoint.
+    Anthropic reuses the cached prefix on later calls with the same system prompt;
+    prompts below the model's minimum cacheable length are simply sent uncached.
+    """
+    return [{"type": "text", "text": system_msg, "cache_control": {"type": "ephemeral"}}]
+
+async def _stream_json_message(**kwargs) -> Tuple[str, Optional[Any]]:
+    """
+    Streams a completion under the adaptive limiter and stops as soon as the text
+    holds a complete JSON object; models often keep writing explanations after it.
+    Returns the object's JSON text (code fences stripped) and the decoded object,
+    or the whole stripped text and None if no object could be decoded.
+    """
+    parts: List[str] = []
+    async with _rate_limited():
+        async with client.messages.stream(**kwargs) as stream:
+            _api_limiter.on_success(stream.response.headers)
+            async for text in stream.text_stream:
+                if not parts:
+                    # Usage arrives with message_start, before the first text delta
+                    _record_prompt_cache_usage(stream.current_message_snapshot.usage)
+                parts.append(text)
+                # The object can only have closed in a chunk with a closing brace
+                if "}" not in text:
+                    continue
+                # Strip markdown code fences if present (```json ... ``` or ``` ... ```)
+                json_str = _FENCE_RE.sub("", "".join(parts).strip())
+                try:
+                    data, json_end = _json_decoder.raw_decode(json_str)
+                except json.JSONDecodeError:
+                    continue
+                # Leaving the stream context closes the connection and ends generation
+                return json_str[:json_end], data
+    # Let pydantic report the malformed payload
+    return _FENCE_RE.sub("", "".join(parts).strip()), None
+
+@lru_cache(maxsize=128)
+def _schema_instruction(response_model: Type[BaseModel]) -> str:
+    """System prompt suffix with the model's JSON schema (fixed per response model class)."""
+    return f"\n\nRespond with valid JSON matching this schema: {json.dumps(response_model.model_json_schema())}"
+
 async def call_llm(
     messages: List[dict],
     model: str = "claude-3-5-haiku-20241022",  # Haiku for speed
@@ -34,45 +241,36 @@ async def call_llm(
     """
     Straightforward LLM call - messages passed directly to Anthropic.
     Handles system messages by extracting them to the system parameter.
-    Uses semaphore to limit concurrent API calls.
+    Concurrency is capped by the adaptive rate-limit limiter.
     Includes in-memory caching.
     """
     cache_key = _get_cache_key(messages, model, temperature, max_tokens)
-    if cache_key in _response_cache:
-        print("⚡ Serving from cache")
-        return _response_cache[cache_key]
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        logger.debug("⚡ Serving from cache")
+        return cached
 
-    async with _api_semaphore:
+    async def fetch() -> Optional[str]:
         try:
-            # Extract system messages from messages array (Anthropic requires them as a separate parameter)
-            system_messages = [msg["content"] for msg in messages if msg.get("role") == "system"]
-            user_messages = [msg for msg in messages if msg.get("role") != "system"]
-
-            # Combine system messages
-            system_msg = "\n\n".join(system_messages) if system_messages else None
-
-            if system_msg:
-                response = await client.messages.create(
-                    model=model,
-                    system=system_msg,
-                    messages=user_messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
-            else:
-                response = await client.messages.create(
-                    model=model,
-                    messages=user_messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
-            
+            system_msg, user_messages = _split_system(messages)
+            system_param = {"system": system_msg} if system_msg else {}
+
+            response = await _create_message(
+                model=model,
+                messages=user_messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **system_param
+            )
+
             content = response.content[0].text
-            _response_cache[cache_key] = content
+            _cache_set(cache_key, content)
             return content
         except Exception as e:
-            print(f"LLM Call Error: {e}")
-            return ""
+            logger.exception(f"LLM Call Error: {e}")
+            return None
+
+    return await _single_flight(cache_key, fetch) or ""
 
 async def call_structured_llm(
     messages: List[dict],
@@ -84,86 +282,56 @@ async def call_structured_llm(
     """
     Structured completion using JSON mode with Anthropic.
     Extracts system messages from the messages array and passes them as a separate system parameter.
-    Uses semaphore to limit concurrent API calls.
+    Concurrency is capped by the adaptive rate-limit limiter.
     Includes in-memory caching.
     """
-    # Note: For structured output, we cache the RAW JSON string, not the parsed object, 
-    # but since we return the object, we'll cache the object reconstruction might be needed if we cache at this level.
-    # Actually, simpler to cache the underlying text response if we extracted logic, but here we'll just cache the result if possible?
-    # No, we can't easily cache the Pydantic object across runs without pickling. 
-    # Let's cache the raw response string in a separate cache or reuse the logic.
-    # To keep it simple and safe, we will implement caching logic inside here too.
-    
+    # Shares _response_cache with call_llm; entries hold the raw JSON string and the
+    # key is suffixed with the response model so the two kinds of entries never collide
     cache_key = _get_cache_key(messages, model, temperature, max_tokens) + f"|{response_model.__name__}"
     
     # Check cache (we store the raw JSON string)
-    if cache_key in _response_cache:
+    cached = _cache_get(cache_key)
+    if cached is not None:
         try:
-            print("⚡ Serving from cache (structured)")
-            return response_model.model_validate_json(_response_cache[cache_key])
+            logger.debug("⚡ Serving from cache (structured)")
+            return response_model.model_validate_json(cached)
         except Exception:
             # If validation fails (schema changed?), invalidate
-            del _response_cache[cache_key]
+            _response_cache.pop(cache_key, None)
 
-    async with _api_semaphore:
+    result: Optional[T] = None
+
+    async def fetch() -> Optional[str]:
+        nonlocal result
         try:
-            # Extract system messages from messages array (Anthropic requires them as a separate parameter)
-            system_messages = [msg["content"] for msg in messages if msg.get("role") == "system"]
-            user_messages = [msg for msg in messages if msg.get("role") != "system"]
-            
+            system_msg, user_messages = _split_system(messages)
+
             # Add instruction to return JSON matching the schema
-            schema = response_model.model_json_schema()
-            schema_instruction = f"\n\nRespond with valid JSON matching this schema: {json.dumps(schema)}"
-            
-            # Combine system messages
-            if system_messages:
-                system_msg = "\n\n".join(system_messages) + schema_instruction
-            else:
-                system_msg = "Eres un asistente de IA útil. Siempre responde en español." + schema_instruction
-            
-            response = await client.messages.create(
+            system_msg = (system_msg or "Eres un asistente de IA útil. Siempre responde en español.") + _schema_instruction(response_model)
+
+            # The system prompt (instructions + schema) is identical across calls for
+            # a given response model; only the user message varies
+            json_str, data = await _stream_json_message(
                 model=model,
-                system=system_msg,
+                system=_cacheable_system(system_msg),
                 messages=user_messages,
                 temperature=temperature,
                 max_tokens=max_tokens
             )
-            
-            json_str = response.content[0].text
-
-            # Strip markdown code blocks if present (```json ... ``` or ``` ... ```)
-            json_str = json_str.strip()
-            if json_str.startswith("```json"):
-                json_str = json_str[7:]  # Remove ```json
-            elif json_str.startswith("```"):
-                json_str = json_str[3:]  # Remove ```
-            if json_str.endswith("```"):
-                json_str = json_str[:-3]  # Remove trailing ```
-            json_str = json_str.strip()
-
-            # Extract only the JSON object (handle trailing text after JSON)
-            # Find the matching closing brace for the opening brace
-            if json_str.startswith("{"):
-                brace_count = 0
-                json_end = 0
-                for i, char in enumerate(json_str):
-                    if char == "{":
-                        brace_count += 1
-                    elif char == "}":
-                        brace_count -= 1
-                        if brace_count == 0:
-                            json_end = i + 1
-                            break
-                if json_end > 0:
-                    json_str = json_str[:json_end]
 
             # Validate and cache
-            result = response_model.model_validate_json(json_str)
-            _response_cache[cache_key] = json_str
-            return result
+            if data is None:
+                result = response_model.model_validate_json(json_str)
+            else:
+                result = response_model.model_validate(data)
+            _cache_set(cache_key, json_str)
+            return json_str
         except Exception as e:
-            print(f"[LLM ERROR] Structured LLM Call Error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"[LLM ERROR] Structured LLM Call Error: {e}")
             return None
 
+    json_str = await _single_flight(cache_key, fetch)
+    if result is not None or json_str is None:
+        return result
+    # Joined another caller's request: validate the JSON it produced
+    return response_model.model_validate_json(json_str)
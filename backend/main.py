@@ -1,6 +1,12 @@
 import asyncio
+import hashlib
+import json
+import logging
 import os
-from typing import Any, Dict, List, Sequence, Tuple
+import sys
+from contextlib import asynccontextmanager
+from itertools import chain
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Sequence, Tuple, Union
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -10,11 +16,17 @@ from dotenv import load_dotenv
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
 
-from schemas import AnalysisRequest, AnalysisResult, RiskLevel, Flag, MarketplaceRequest, ScoreBreakdown
+from schemas import AnalysisRequest, AnalysisResult, BatchAnalysisRequest, BatchItemError, BatchMarketplaceRequest, RiskLevel, Flag, MarketplaceRequest, ScoreBreakdown
 from agents import ecommerce_guard_agent, reviews_agent, price_comparison_agent
+from tavily_client import close_tavily_client
+from llm import close_llm_client, get_prompt_cache_usage
+from singleflight import single_flight
 from marketplace_agents import (
     seller_trust_agent,
     pricing_agent,
@@ -26,11 +38,27 @@ from marketplace_agents import (
     supplier_confidence_agent
 )
 
+logger = logging.getLogger(__name__)
+
 if not os.getenv("ANTHROPIC_API_KEY"):
     print("⚠️  WARNING: ANTHROPIC_API_KEY not set. LLM-based analysis will fail.")
     print("   Create a .env file in backend/ directory with: ANTHROPIC_API_KEY=your_key_here")
 
-app = FastAPI(title="BodyCart Backend")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Shared API clients hold connection pools open between requests
+    await close_tavily_client()
+    await close_llm_client()
+    # The shared Playwright browser, if anything started it. Looked up rather than
+    # imported so deployments without Playwright never load the scraper module
+    scraper_module = sys.modules.get("services.scraper")
+    if scraper_module is not None:
+        await scraper_module.close_scraper()
+
+
+app = FastAPI(title="BodyCart Backend", lifespan=lifespan)
 
 # Allow CORS for browser extension
 app.add_middleware(
@@ -44,10 +72,7 @@ app.add_middleware(
 
 def _collect_flags(*responses: Sequence[Dict[str, Any]]) -> List[Flag]:
     """Flatten flags returned by each agent while tolerating missing data."""
-    aggregated: List[Flag] = []
-    for resp in responses:
-        aggregated.extend(resp.get("flags") or [])
-    return aggregated
+    return list(chain.from_iterable(resp.get("flags") or () for resp in responses))
 
 
 def _collect_details(*responses: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
@@ -60,6 +85,20 @@ def _collect_details(*responses: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
     return aggregated
 
 
+def _isolate_failures(names: Sequence[str], results: Sequence[Any]) -> List[Dict[str, Any]]:
+    """
+    Replace agents that raised (gathered with return_exceptions=True) with an empty result,
+    so one failing agent doesn't discard the others' work.
+    """
+    isolated: List[Dict[str, Any]] = []
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            logger.error(f"✗ Agent {name} failed: {result!r}")
+            result = {"flags": [], "score_impact": 0, "details": {}}
+        isolated.append(result)
+    return isolated
+
+
 def _assess_risk(score: int) -> Tuple[RiskLevel, str]:
     """Map a score to a risk level and a default verdict title."""
     if score >= 80:
@@ -78,22 +117,59 @@ def _assess_risk(score: int) -> Tuple[RiskLevel, str]:
     )
 
 
+# Analyses currently running, by endpoint and request digest. Identical concurrent
+# requests (the same page opened in two tabs, a viral listing) await the first one
+# instead of running every agent again
+_in_flight: Dict[Tuple[str, str], "asyncio.Future[AnalysisResult]"] = {}
+
+
+async def _single_flight(
+    endpoint: str,
+    request: BaseModel,
+    analyze: Callable[[Any], Awaitable[AnalysisResult]]
+) -> AnalysisResult:
+    """Run analyze once per distinct in-flight request; duplicates share its result."""
+    key = (endpoint, hashlib.blake2b(request.model_dump_json().encode(), digest_size=16).hexdigest())
+    return await single_flight(_in_flight, key, lambda: analyze(request))
+
+
+# Agents behind /analyze, in the order _build_page_result takes their outputs
+PAGE_AGENTS = (
+    ("ecommerce_guard", ecommerce_guard_agent),
+    ("reviews", reviews_agent),
+    ("price_comparison", price_comparison_agent),
+)
+PAGE_AGENT_NAMES = tuple(name for name, _ in PAGE_AGENTS)
+
+
 @app.post("/analyze", response_model=AnalysisResult)
 async def analyze_page(request: AnalysisRequest):
     """
     Analyze an e-commerce page for security threats.
     
     Note: The frontend shows progress messages during analysis.
-    Future enhancement: Agents could send progress updates via SSE or websockets.
-    For now, frontend uses hardcoded messages that cycle automatically.
+    /analyze/stream returns the same analysis as server-sent events, one per agent;
+    this endpoint is used with hardcoded messages that cycle automatically.
     """
+    return await _single_flight("analyze", request, _analyze_page)
+
+
+async def _analyze_page(request: AnalysisRequest) -> AnalysisResult:
+    """Body of analyze_page, run once per distinct in-flight request."""
     # Run agents in parallel
-    ai_res, reviews_res, price_res = await asyncio.gather(
-        ecommerce_guard_agent(request),
-        reviews_agent(request),
-        price_comparison_agent(request)
+    results = await asyncio.gather(
+        *(agent(request) for _, agent in PAGE_AGENTS),
+        return_exceptions=True
     )
+    return _build_page_result(*_isolate_failures(PAGE_AGENT_NAMES, results))
+
 
+def _build_page_result(
+    ai_res: Dict[str, Any],
+    reviews_res: Dict[str, Any],
+    price_res: Dict[str, Any]
+) -> AnalysisResult:
+    """Aggregate the page agents' outputs into the final verdict."""
     # Aggregate score contributions
     final_score = 100
     final_score -= ai_res.get("score_impact", 0)
@@ -111,7 +187,10 @@ async def analyze_page(request: AnalysisRequest):
         "price_comparison": price_res
     }
 
-    return AnalysisResult(
+    # Built without validation: score is a clamped int, risk_level a RiskLevel from
+    # _assess_risk, and the verdict strings and flags come from validated LLM results
+    # or literals. Anything less trusted must go through AnalysisResult(...)
+    return AnalysisResult.model_construct(
         score=final_score,
         risk_level=risk_level,
         verdict_title=verdict_title,
@@ -121,6 +200,98 @@ async def analyze_page(request: AnalysisRequest):
         agent_outputs=agent_outputs
     )
 
+
+@app.post("/analyze/stream")
+async def analyze_page_stream(request: AnalysisRequest):
+    """
+    Same analysis as /analyze, streamed as server-sent events.
+
+    Emits an `agent` event ({"name", "result"}) as soon as each agent finishes, so the
+    frontend can show real progress, then a `final` event with the AnalysisResult.
+    """
+    return StreamingResponse(_page_events(request), media_type="text/event-stream")
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+
+async def _page_events(request: AnalysisRequest) -> AsyncIterator[str]:
+    async def run(name: str, agent: Callable[[AnalysisRequest], Awaitable[Dict[str, Any]]]):
+        try:
+            return name, await agent(request)
+        except Exception as e:
+            return name, e
+
+    tasks = [asyncio.create_task(run(name, agent)) for name, agent in PAGE_AGENTS]
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            name, result = await next_done
+            results[name] = _isolate_failures((name,), (result,))[0]
+            yield _sse("agent", {"name": name, "result": results[name]})
+        yield _sse("final", _build_page_result(*(results[name] for name in PAGE_AGENT_NAMES)))
+    finally:
+        # Client disconnected mid-stream: stop the remaining agents
+        for task in tasks:
+            task.cancel()
+
+
+# Upper bound on pages/listings per batch call; every item still fans out to all agents
+MAX_BATCH_ITEMS = 8
+
+
+def _batch_results(results: Sequence[Any]) -> List[Union[AnalysisResult, BatchItemError]]:
+    """
+    Replace items that raised (gathered with return_exceptions=True) with an error entry,
+    so one failing item doesn't discard the other items' results.
+    """
+    entries: List[Union[AnalysisResult, BatchItemError]] = []
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            logger.error(f"✗ Batch item {index} failed: {result!r}")
+            result = BatchItemError(error="Analysis failed for this item")
+        entries.append(result)
+    return entries
+
+
+@app.post("/analyze/batch", response_model=List[Union[AnalysisResult, BatchItemError]])
+async def analyze_batch(request: BatchAnalysisRequest):
+    """
+    Analyze several e-commerce pages in one request.
+
+    Pages run concurrently and share the same caches, in-flight deduplication and
+    Anthropic rate limiting as /analyze; results are returned in request order, with a
+    BatchItemError in place of any page whose analysis failed.
+    """
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+    return _batch_results(await asyncio.gather(
+        *(_single_flight("analyze", item, _analyze_page) for item in request.items),
+        return_exceptions=True
+    ))
+
+
+# Skip the supplier confidence LLM call when the rule-based score is already decisive
+# (opt-in while the thresholds are validated against LLM verdicts)
+SHORTCIRCUIT_ENABLED = os.getenv("SHORTCIRCUIT_ENABLED", "").lower() in ("1", "true", "yes")
+SHORTCIRCUIT_LOW = 20
+SHORTCIRCUIT_HIGH = 95
+
+
+def _rule_based_verdict(score: int) -> Dict[str, Any]:
+    """Stand-in for supplier_confidence_agent's output when the rules alone decide."""
+    risk_level, verdict_title = _assess_risk(score)
+    return {
+        "flags": [],
+        "details": {"analysis_method": "rules", "shortcircuit": True},
+        "score": score,
+        "risk_level": risk_level.value,
+        "verdict_title": verdict_title,
+        "verdict_message": "Las señales detectadas por las reglas son contundentes; no fue necesario el análisis de IA."
+    }
+
+
 @app.post("/analyze/marketplace", response_model=AnalysisResult)
 async def analyze_marketplace(request: MarketplaceRequest):
     """
@@ -139,6 +310,11 @@ async def analyze_marketplace(request: MarketplaceRequest):
 
     Returns a detailed score breakdown showing contribution of each factor.
     """
+    return await _single_flight("analyze_marketplace", request, _analyze_marketplace)
+
+
+async def _analyze_marketplace(request: MarketplaceRequest) -> AnalysisResult:
+    """Body of analyze_marketplace, run once per distinct in-flight request."""
     # Phase 1: Run ALL rule-based agents in parallel
     (
         seller_res,
@@ -148,28 +324,42 @@ async def analyze_marketplace(request: MarketplaceRequest):
         image_res,
         red_flags_res,
         description_res
-    ) = await asyncio.gather(
-        seller_trust_agent(request),
-        seller_history_agent(request),
-        pricing_agent(request),
-        price_analysis_agent(request),
-        image_analysis_agent(request),
-        red_flags_agent(request),
-        description_quality_agent(request)
+    ) = _isolate_failures(
+        (
+            "seller_trust",
+            "seller_history",
+            "pricing",
+            "price_analysis",
+            "image_analysis",
+            "red_flags",
+            "description_quality"
+        ),
+        await asyncio.gather(
+            seller_trust_agent(request),
+            seller_history_agent(request),
+            pricing_agent(request),
+            price_analysis_agent(request),
+            image_analysis_agent(request),
+            red_flags_agent(request),
+            description_quality_agent(request),
+            return_exceptions=True
+        )
     )
 
     # Collect all flags from rule-based agents
-    rule_based_flags = []
-    rule_based_flags.extend(seller_res.get("flags", []))
-    rule_based_flags.extend(seller_history_res.get("flags", []))
-    rule_based_flags.extend(pricing_res.get("flags", []))
-    rule_based_flags.extend(price_analysis_res.get("flags", []))
-    rule_based_flags.extend(image_res.get("flags", []))
-    rule_based_flags.extend(red_flags_res.get("flags", []))
-    rule_based_flags.extend(description_res.get("flags", []))
+    rule_based_flags = _collect_flags(
+        seller_res,
+        seller_history_res,
+        pricing_res,
+        price_analysis_res,
+        image_res,
+        red_flags_res,
+        description_res
+    )
 
     # Build score breakdown from agent impacts
-    score_breakdown = ScoreBreakdown(
+    # Every score_impact is an int computed by our own agents, so skip validation
+    score_breakdown = ScoreBreakdown.model_construct(
         base_score=100,
         seller_longevity=-seller_res.get("score_impact", 0),  # Negate because impact is subtracted
         post_history=-seller_history_res.get("score_impact", 0),
@@ -182,10 +372,18 @@ async def analyze_marketplace(request: MarketplaceRequest):
     )
 
     # Phase 2: LLM-based holistic analysis with all data
-    # The LLM determines the final score based on ALL available information
-    # Pass image analysis details for more context
-    image_analysis_details = image_res.get("details", {}).get("ai_analysis", {})
-    ai_res = await supplier_confidence_agent(request, rule_based_flags, image_analysis_details)
+    # The LLM determines the final score based on ALL available information,
+    # unless the rule-based agents alone already settle the verdict
+    preliminary_score = 100 - sum(
+        res.get("score_impact", 0)
+        for res in (seller_res, seller_history_res, pricing_res, price_analysis_res, image_res, red_flags_res, description_res)
+    )
+    if SHORTCIRCUIT_ENABLED and (preliminary_score <= SHORTCIRCUIT_LOW or preliminary_score >= SHORTCIRCUIT_HIGH):
+        ai_res = _rule_based_verdict(max(0, min(100, preliminary_score)))
+    else:
+        # Pass image analysis details for more context
+        image_analysis_details = image_res.get("details", {}).get("ai_analysis", {})
+        ai_res = await supplier_confidence_agent(request, rule_based_flags, image_analysis_details)
 
     # Use LLM's score directly (not calculated from impacts)
     final_score = ai_res.get("score", 50)
@@ -244,17 +442,38 @@ async def analyze_marketplace(request: MarketplaceRequest):
         score_breakdown=score_breakdown
     )
 
+
+@app.post("/analyze/marketplace/batch", response_model=List[Union[AnalysisResult, BatchItemError]])
+async def analyze_marketplace_batch(request: BatchMarketplaceRequest):
+    """
+    Analyze several Marketplace listings in one request.
+
+    Listings run concurrently and share the same caches, in-flight deduplication and
+    Anthropic rate limiting as /analyze/marketplace; results are returned in request order,
+    with a BatchItemError in place of any listing whose analysis failed.
+    """
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+    return _batch_results(await asyncio.gather(
+        *(_single_flight("analyze_marketplace", item, _analyze_marketplace) for item in request.items),
+        return_exceptions=True
+    ))
+
+def _key_status(name: str) -> str:
+    value = os.getenv(name)
+    return "✓ configured" if value and not value.startswith("your_") else "✗ missing"
+
+
+# Keys are read once at startup (after .env is loaded), so the status can't change
+_KEY_STATUS = {name: _key_status(name) for name in ("ANTHROPIC_API_KEY", "TAVILY_API_KEY")}
+
+
 @app.get("/")
 def read_root():
     """Health check endpoint that shows API key configuration status."""
-    anthropic_key = os.getenv("ANTHROPIC_API_KEY")
-    tavily_key = os.getenv("TAVILY_API_KEY")
-
     return {
         "status": "ok",
         "service": "BodyCart API",
-        "config": {
-            "ANTHROPIC_API_KEY": "✓ configured" if anthropic_key and not anthropic_key.startswith("your_") else "✗ missing",
-            "TAVILY_API_KEY": "✓ configured" if tavily_key and not tavily_key.startswith("your_") else "✗ missing"
-        }
+        "config": _KEY_STATUS,
+        "prompt_cache": get_prompt_cache_usage()
     }
@@ -10,25 +10,141 @@ Specialized agents for detecting fraud/scams on FB Marketplace:
 """
 
 import asyncio
+import logging
 import re
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional, List
 from pydantic import BaseModel, Field
 from schemas import MarketplaceRequest, Flag
-from llm import call_structured_llm
-
-
+from llm import call_structured_llm, image_media_type
+
+logger = logging.getLogger(__name__)
+
+# --- Parsing patterns ---
+
+YEAR_RE = re.compile(r'(19|20)\d{2}')
+# The lookbehinds below only let a match start at the beginning of a run, so a long
+# run of digits/word characters without a unit or '@' is scanned once instead of
+# once per starting position (quadratic on hostile input)
+DAYS_AGO_RE = re.compile(r'(?<!\d)(\d+)\s*(day|día|dias)')
+WEEKS_AGO_RE = re.compile(r'(?<!\d)(\d+)\s*(week|semana)')
+MONTHS_AGO_RE = re.compile(r'(?<!\d)(\d+)\s*(month|mes)')
+# Everything but digits and the decimal point (currency symbols, spaces, separators)
+NON_PRICE_CHARS_RE = re.compile(r'[^\d.]')
+NUMBER_RE = re.compile(r'(\d+)')
+MANY_DIGITS_RE = re.compile(r'\d{4,}')
+# Review count in strengths like "Comunicación (13)"
+PAREN_COUNT_RE = re.compile(r'\((\d+)\)')
+# Same matches as \b[\w.-]+@[\w.-]+\.\w+\b: the local part needs a word character
+EMAIL_RE = re.compile(r'(?<![\w.-])[.-]*\w[\w.-]*@[\w.-]+\.\w+\b')
+REPEATED_PUNCTUATION_RE = re.compile(r'[!?]{2,}')
+EMOJI_RE = re.compile(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF]')
+
+# Vague/uninformative language in descriptions (matched against lowercase text)
+VAGUE_PATTERNS = tuple((re.compile(pattern), message) for pattern, message in (
+    (r'contacta?r?\s*(para|for)\s*(más|more|m[aá]s)\s*(info|información|details)', 'Información vaga: "contactar para más info"'),
+    (r'pregunt[ae]r?\s*(por|for)', 'Información vaga: "preguntar por detalles"'),
+    (r'no\s+preguntas?\s+tontas?', 'Lenguaje hostil hacia compradores'),
+    (r'solo\s+interesados?', 'Filtro de compradores'),
+))
+
+# Specific details that signal a genuine description (matched against lowercase text)
+SPECIFICITY_PATTERNS = tuple((re.compile(pattern), detail_type) for pattern, detail_type in (
+    (r'\b\d+\s*(gb|tb|inch|pulgadas?|cm|mm|kg|lb)\b', 'specs'),
+    (r'\b(modelo|model|serie|series)\s*:?\s*\w+', 'model'),
+    (r'\b(marca|brand)\s*:?\s*\w+', 'brand'),
+    (r'\b\d{4}\b', 'year'),  # Year mention
+    (r'\b(original|auténtico|genuine|authentic)\b', 'authenticity'),
+    (r'\b(garant[ií]a|warranty)\b', 'warranty'),
+    (r'\b(factura|receipt|invoice)\b', 'receipt'),
+))
+
+
+def _keyword_re(keywords) -> re.Pattern:
+    """
+    Single alternation of literal keywords. One search over the text tells whether
+    any keyword occurs, so clean listings skip the per-keyword scans entirely.
+    """
+    return re.compile("|".join(map(re.escape, keywords)))
+
+
+# Every byte value except ASCII A-Z
+NON_UPPERCASE_BYTES = bytes(b for b in range(256) if not 65 <= b <= 90)
+
+
+def _count_uppercase(text: str) -> int:
+    """Number of uppercase characters; ASCII text is counted in a single bytes.translate pass."""
+    if text.isascii():
+        return len(text.encode("ascii").translate(None, NON_UPPERCASE_BYTES))
+    return sum(map(str.isupper, text))
+
+
+# Brands/products that are never legitimately sold for pocket change (matched against lowercase titles)
+HIGH_VALUE_KEYWORDS = ('iphone', 'macbook', 'playstation', 'ps5', 'xbox', 'nintendo', 'laptop', 'samsung', 'gpu', 'rtx')
+HIGH_VALUE_KEYWORDS_RE = _keyword_re(HIGH_VALUE_KEYWORDS)
+
+# Scam patterns checked by red_flags_agent, as (pattern, message) in priority order
+PAYMENT_RED_FLAGS = (
+    ('zelle', 'Menciona Zelle (pago fuera de plataforma)'),
+    ('venmo', 'Menciona Venmo (pago fuera de plataforma)'),
+    ('cashapp', 'Menciona CashApp (pago fuera de plataforma)'),
+    ('cash app', 'Menciona Cash App (pago fuera de plataforma)'),
+    ('wire transfer', 'Solicita transferencia bancaria'),
+    ('transferencia', 'Solicita transferencia bancaria'),
+    ('gift card', 'Menciona tarjetas de regalo (común en estafas)'),
+    ('tarjeta de regalo', 'Menciona tarjetas de regalo (común en estafas)'),
+    ('crypto', 'Solicita pago en criptomonedas'),
+    ('bitcoin', 'Solicita pago en Bitcoin'),
+)
+PAYMENT_RED_FLAGS_RE = _keyword_re(pattern for pattern, _ in PAYMENT_RED_FLAGS)
+
+CONTACT_RED_FLAGS = (
+    ('whatsapp', 'Solicita contacto por WhatsApp (evita registro de FB)'),
+    ('telegram', 'Solicita contacto por Telegram'),
+    ('text me', 'Solicita contacto directo por texto'),
+    ('call me', 'Solicita llamada directa'),
+    ('escríbeme al', 'Solicita contacto fuera de Facebook'),
+)
+CONTACT_RED_FLAGS_RE = _keyword_re(pattern for pattern, _ in CONTACT_RED_FLAGS)
+
+SCAM_PHRASES = (
+    ('serious buyers only', 'Frase común en estafas: "serious buyers only"'),
+    ('solo compradores serios', 'Frase común en estafas: "solo compradores serios"'),
+    ('no lowballers', 'Frase defensiva común'),
+    ('price is firm', 'Precio no negociable puede indicar urgencia'),
+    ('send deposit', 'Solicita depósito por adelantado'),
+    ('deposito', 'Solicita depósito por adelantado'),
+    ('shipping only', 'Solo envío (no permite verificar en persona)'),
+    ('solo envio', 'Solo envío (no permite verificar en persona)'),
+)
+SCAM_PHRASES_RE = _keyword_re(pattern for pattern, _ in SCAM_PHRASES)
+
+# Seller badges as (keywords, flag message, score impact); the first matching rule applies
+BADGE_RULES = (
+    (('buena calificación', 'good rating'), "🏆 Insignia: {badge}", -10),
+    (('responde rápido', 'responds quickly'), "⚡ Insignia: {badge}", -5),
+    (('destacado', 'top'), "🌟 Vendedor destacado", -15),
+)
+
+# Scraped dates, prices and counts come from a small vocabulary ("Joined in 2019",
+# "hace 3 días", "$1.500"), so the pure parsers below are memoized
+PARSE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_join_year(join_date: Optional[str]) -> Optional[int]:
     """Extract year from strings like 'Joined in 2019', 'Se unió en 2019', etc."""
     if not join_date:
         return None
     # Match any 4-digit year starting with 19 or 20
-    match = re.search(r'(19|20)\d{2}', join_date)
+    match = YEAR_RE.search(join_date)
     if match:
         return int(match.group())
     return None
 
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_posted_days(posted_date: Optional[str]) -> Optional[int]:
     """Extract days from strings like 'Listed 2 days ago', '3 semanas', etc."""
     if not posted_date:
@@ -48,23 +164,24 @@ def parse_posted_days(posted_date: Optional[str]) -> Optional[int]:
         return 1
 
     # Days (English and Spanish)
-    match = re.search(r'(\d+)\s*(day|día|dias)', posted_lower)
+    match = DAYS_AGO_RE.search(posted_lower)
     if match:
         return int(match.group(1))
 
     # Weeks (English and Spanish)
-    match = re.search(r'(\d+)\s*(week|semana)', posted_lower)
+    match = WEEKS_AGO_RE.search(posted_lower)
     if match:
         return int(match.group(1)) * 7
 
     # Months (English and Spanish)
-    match = re.search(r'(\d+)\s*(month|mes)', posted_lower)
+    match = MONTHS_AGO_RE.search(posted_lower)
     if match:
         return int(match.group(1)) * 30
 
     return None
 
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_price(price_str: Optional[str]) -> Optional[float]:
     """Extract numeric price from strings like '$1,500', '90 000 $', 'Free', 'Gratis'"""
     if not price_str:
@@ -73,18 +190,19 @@ def parse_price(price_str: Optional[str]) -> Optional[float]:
     if 'free' in price_lower or 'gratis' in price_lower:
         return 0.0
     # Remove currency symbols, spaces, and commas - keep only digits and decimal point
-    cleaned = re.sub(r'[^\d.]', '', price_str.replace(' ', ''))
+    cleaned = NON_PRICE_CHARS_RE.sub('', price_str)
     try:
         return float(cleaned)
     except ValueError:
         return None
 
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_listings_count(listings_str: Optional[str]) -> Optional[int]:
     """Extract number from listings count strings like '20+', '5 publicaciones'"""
     if not listings_str:
         return None
-    match = re.search(r'(\d+)', listings_str)
+    match = NUMBER_RE.search(listings_str)
     if match:
         return int(match.group(1))
     return None
@@ -116,7 +234,7 @@ async def seller_trust_agent(request: MarketplaceRequest) -> dict:
 
     # Check account age
     join_year = parse_join_year(seller.join_date)
-    print(f"[DEBUG] parsed join_year: {join_year}")
+    logger.debug("parsed join_year: %s", join_year)
     current_year = datetime.now().year
 
     if join_year:
@@ -156,14 +274,15 @@ async def seller_trust_agent(request: MarketplaceRequest) -> dict:
     if seller.name:
         details["seller_name"] = seller.name
         # Check for suspicious patterns in name
-        if re.search(r'\d{4,}', seller.name):  # Many numbers in name
+        if MANY_DIGITS_RE.search(seller.name):  # Many numbers in name
             flags.append(Flag(type="warning", msg="Nombre de perfil contiene muchos números"))
             score_impact += 5
 
     # Check response rate
     if seller.response_rate:
         details["response_rate"] = seller.response_rate
-        if 'hour' in seller.response_rate.lower() or 'minute' in seller.response_rate.lower():
+        response_rate_lower = seller.response_rate.lower()
+        if 'hour' in response_rate_lower or 'minute' in response_rate_lower:
             flags.append(Flag(type="info", msg=f"Vendedor responde rápido: {seller.response_rate}"))
 
     # Check other listings (legacy field)
@@ -183,7 +302,7 @@ async def seller_trust_agent(request: MarketplaceRequest) -> dict:
     if seller.listings_count:
         details["listings_count"] = seller.listings_count
         # Parse the number from "20+" format
-        match = re.search(r'(\d+)', seller.listings_count)
+        match = NUMBER_RE.search(seller.listings_count)
         if match:
             listing_num = int(match.group(1))
             if listing_num >= 10:
@@ -233,25 +352,19 @@ async def seller_trust_agent(request: MarketplaceRequest) -> dict:
         details["badges"] = seller.badges
         for badge in seller.badges:
             badge_lower = badge.lower()
-            if 'buena calificación' in badge_lower or 'good rating' in badge_lower:
-                flags.append(Flag(type="info", msg=f"🏆 Insignia: {badge}"))
-                score_impact -= 10
-            elif 'responde rápido' in badge_lower or 'responds quickly' in badge_lower:
-                flags.append(Flag(type="info", msg=f"⚡ Insignia: {badge}"))
-                score_impact -= 5
-            elif 'destacado' in badge_lower or 'top' in badge_lower:
-                flags.append(Flag(type="info", msg=f"🌟 Vendedor destacado"))
-                score_impact -= 15
+            for keywords, message, impact in BADGE_RULES:
+                if any(keyword in badge_lower for keyword in keywords):
+                    flags.append(Flag(type="info", msg=message.format(badge=badge)))
+                    score_impact += impact
+                    break
 
     # Check strengths (Comunicación, Puntualidad, etc.)
     if seller.strengths and len(seller.strengths) > 0:
         details["strengths"] = seller.strengths
-        total_positive_reviews = 0
-        for strength in seller.strengths:
-            # Parse format like "Comunicación (13)"
-            match = re.search(r'\((\d+)\)', strength)
-            if match:
-                total_positive_reviews += int(match.group(1))
+        # Parse format like "Comunicación (13)"; only the first count in each strength is used
+        total_positive_reviews = sum(
+            int(match.group(1)) for match in map(PAREN_COUNT_RE.search, seller.strengths) if match
+        )
 
         if total_positive_reviews >= 20:
             flags.append(Flag(type="info", msg=f"Vendedor con {total_positive_reviews}+ reseñas positivas en aspectos clave"))
@@ -308,23 +421,22 @@ async def pricing_agent(request: MarketplaceRequest) -> dict:
             score_impact += 10
 
         # Very low price for electronics/high-value items (heuristic)
-        high_value_keywords = ['iphone', 'macbook', 'playstation', 'ps5', 'xbox', 'nintendo', 'laptop', 'samsung', 'gpu', 'rtx']
-
-        for keyword in high_value_keywords:
-            if keyword in title_lower:
-                if price > 0 and price < 100:
-                    flags.append(Flag(
-                        type="critical",
-                        msg=f"Precio sospechosamente bajo para {keyword.upper()}: {listing.price}"
-                    ))
-                    score_impact += 25
-                elif price > 0 and price < 300:
-                    flags.append(Flag(
-                        type="warning",
-                        msg=f"Precio muy bajo para {keyword.upper()}: {listing.price}"
-                    ))
-                    score_impact += 10
-                break
+        if HIGH_VALUE_KEYWORDS_RE.search(title_lower):
+            for keyword in HIGH_VALUE_KEYWORDS:
+                if keyword in title_lower:
+                    if price > 0 and price < 100:
+                        flags.append(Flag(
+                            type="critical",
+                            msg=f"Precio sospechosamente bajo para {keyword.upper()}: {listing.price}"
+                        ))
+                        score_impact += 25
+                    elif price > 0 and price < 300:
+                        flags.append(Flag(
+                            type="warning",
+                            msg=f"Precio muy bajo para {keyword.upper()}: {listing.price}"
+                        ))
+                        score_impact += 10
+                    break
 
     # Check for urgency in title/description - tracked in details only
     urgency_patterns = ['urge', 'urgente', 'hoy', 'today only', 'must go', 'moving']
@@ -393,15 +505,18 @@ MARKET_PRICE_RANGES = {
     "apple watch": (150, 500),
 }
 
+# Longest keys first so the most specific product wins ("iphone 15 pro max" over "iphone 15")
+PRODUCTS_BY_LENGTH = tuple(sorted(MARKET_PRICE_RANGES, key=len, reverse=True))
+PRODUCTS_RE = _keyword_re(PRODUCTS_BY_LENGTH)
+
 
 def find_product_match(title: str) -> Optional[tuple]:
     """Find matching product in price database and return (product_name, min_price, max_price)."""
     title_lower = title.lower()
+    if not PRODUCTS_RE.search(title_lower):
+        return None
 
-    # Sort by key length (longest first) to match more specific products first
-    sorted_products = sorted(MARKET_PRICE_RANGES.keys(), key=len, reverse=True)
-
-    for product in sorted_products:
+    for product in PRODUCTS_BY_LENGTH:
         if product in title_lower:
             min_price, max_price = MARKET_PRICE_RANGES[product]
             return (product, min_price, max_price)
@@ -637,9 +752,9 @@ async def image_analysis_agent(request: MarketplaceRequest) -> dict:
 
     # Perform AI vision analysis if screenshot is available
     # OPTIMIZED: Simplified prompt for faster response
-    print(f"[IMAGE_ANALYSIS] Screenshot available: {bool(request.screenshot_base64)}")
+    logger.debug("[IMAGE_ANALYSIS] Screenshot available: %s", bool(request.screenshot_base64))
     if request.screenshot_base64:
-        print(f"[IMAGE_ANALYSIS] Screenshot length: {len(request.screenshot_base64)} chars")
+        logger.debug("[IMAGE_ANALYSIS] Screenshot length: %d chars", len(request.screenshot_base64))
         details["screenshot_available"] = True
 
         # Vision analysis with detailed product description
@@ -648,7 +763,7 @@ async def image_analysis_agent(request: MarketplaceRequest) -> dict:
                 "type": "image",
                 "source": {
                     "type": "base64",
-                    "media_type": "image/png",
+                    "media_type": image_media_type(request.screenshot_base64),
                     "data": request.screenshot_base64
                 }
             },
@@ -685,9 +800,9 @@ Sé específico y útil para el comprador."""
         ]
 
         try:
-            print("[IMAGE_ANALYSIS] Calling LLM for image analysis...")
+            logger.debug("[IMAGE_ANALYSIS] Calling LLM for image analysis...")
             result = await call_structured_llm(messages, ImageAnalysisResult, max_tokens=800)
-            print(f"[IMAGE_ANALYSIS] LLM result: {result}")
+            logger.debug("[IMAGE_ANALYSIS] LLM result: %s", result)
 
             if result:
                 details["ai_analysis"] = {
@@ -740,7 +855,7 @@ Sé específico y útil para el comprador."""
 
                 details["image_authenticity_confidence"] = result.confidence
         except Exception as e:
-            print(f"[WARNING] Image analysis failed: {e}")
+            logger.warning("Image analysis failed: %s", e)
             details["ai_analysis_error"] = str(e)
     else:
         details["screenshot_available"] = False
@@ -773,66 +888,36 @@ async def red_flags_agent(request: MarketplaceRequest) -> dict:
     combined_text = f"{title} {description}".lower()
 
     # Payment red flags
-    payment_red_flags = [
-        ('zelle', 'Menciona Zelle (pago fuera de plataforma)'),
-        ('venmo', 'Menciona Venmo (pago fuera de plataforma)'),
-        ('cashapp', 'Menciona CashApp (pago fuera de plataforma)'),
-        ('cash app', 'Menciona Cash App (pago fuera de plataforma)'),
-        ('wire transfer', 'Solicita transferencia bancaria'),
-        ('transferencia', 'Solicita transferencia bancaria'),
-        ('gift card', 'Menciona tarjetas de regalo (común en estafas)'),
-        ('tarjeta de regalo', 'Menciona tarjetas de regalo (común en estafas)'),
-        ('crypto', 'Solicita pago en criptomonedas'),
-        ('bitcoin', 'Solicita pago en Bitcoin'),
-    ]
-
-    for pattern, message in payment_red_flags:
-        if pattern in combined_text:
-            flags.append(Flag(type="critical", msg=message))
-            score_impact += 20
-            details["payment_red_flag"] = pattern
-            break  # Only flag once for payment
+    if PAYMENT_RED_FLAGS_RE.search(combined_text):
+        for pattern, message in PAYMENT_RED_FLAGS:
+            if pattern in combined_text:
+                flags.append(Flag(type="critical", msg=message))
+                score_impact += 20
+                details["payment_red_flag"] = pattern
+                break  # Only flag once for payment
 
     # Contact bypass red flags
-    contact_red_flags = [
-        ('whatsapp', 'Solicita contacto por WhatsApp (evita registro de FB)'),
-        ('telegram', 'Solicita contacto por Telegram'),
-        ('text me', 'Solicita contacto directo por texto'),
-        ('call me', 'Solicita llamada directa'),
-        ('escríbeme al', 'Solicita contacto fuera de Facebook'),
-    ]
-
-    for pattern, message in contact_red_flags:
-        if pattern in combined_text:
-            flags.append(Flag(type="warning", msg=message))
-            score_impact += 10
-            details["contact_bypass"] = pattern
-            break
+    if CONTACT_RED_FLAGS_RE.search(combined_text):
+        for pattern, message in CONTACT_RED_FLAGS:
+            if pattern in combined_text:
+                flags.append(Flag(type="warning", msg=message))
+                score_impact += 10
+                details["contact_bypass"] = pattern
+                break
 
-    # Email in description
-    email_pattern = re.search(r'\b[\w.-]+@[\w.-]+\.\w+\b', combined_text)
-    if email_pattern:
+    # Email in description (most listings have no '@' at all, so skip the regex for them)
+    if "@" in combined_text and EMAIL_RE.search(combined_text):
         flags.append(Flag(type="warning", msg="Email en la descripción"))
         score_impact += 5
         details["email_in_description"] = True
 
     # Scam phrases
-    scam_phrases = [
-        ('serious buyers only', 'Frase común en estafas: "serious buyers only"'),
-        ('solo compradores serios', 'Frase común en estafas: "solo compradores serios"'),
-        ('no lowballers', 'Frase defensiva común'),
-        ('price is firm', 'Precio no negociable puede indicar urgencia'),
-        ('send deposit', 'Solicita depósito por adelantado'),
-        ('deposito', 'Solicita depósito por adelantado'),
-        ('shipping only', 'Solo envío (no permite verificar en persona)'),
-        ('solo envio', 'Solo envío (no permite verificar en persona)'),
-    ]
-
-    for pattern, message in scam_phrases:
-        if pattern in combined_text:
-            flags.append(Flag(type="info", msg=message))
-            # Lower impact for these - they're suspicious but not definitive
-            score_impact += 3
+    if SCAM_PHRASES_RE.search(combined_text):
+        for pattern, message in SCAM_PHRASES:
+            if pattern in combined_text:
+                flags.append(Flag(type="info", msg=message))
+                # Lower impact for these - they're suspicious but not definitive
+                score_impact += 3
 
     # Location mismatch check
     if listing and listing.location and request.seller and request.seller.location:
@@ -905,48 +990,34 @@ async def description_quality_agent(request: MarketplaceRequest) -> dict:
         details["length_rating"] = "adequate"
 
     # Check for ALL CAPS (suspicious)
-    upper_ratio = sum(1 for c in description if c.isupper()) / max(len(description), 1)
+    upper_ratio = _count_uppercase(description) / max(len(description), 1)
     details["uppercase_ratio"] = round(upper_ratio, 2)
     if upper_ratio > 0.5 and desc_len > 20:
         flags.append(Flag(type="warning", msg="Descripción mayormente en MAYÚSCULAS"))
         score_impact += 5
 
     # Check for excessive punctuation/emojis
-    punctuation_count = len(re.findall(r'[!?]{2,}', description))
-    emoji_count = len(re.findall(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF]', description))
+    punctuation_count = len(REPEATED_PUNCTUATION_RE.findall(description))
+    # Emojis are all outside ASCII; isascii() is a constant-time flag check
+    emoji_count = 0 if description.isascii() else len(EMOJI_RE.findall(description))
     details["excessive_punctuation"] = punctuation_count
     details["emoji_count"] = emoji_count
 
     if punctuation_count > 3:
         score_impact += 3
 
-    # Check for vague/uninformative language
-    vague_patterns = [
-        (r'contacta?r?\s*(para|for)\s*(más|more|m[aá]s)\s*(info|información|details)', 'Información vaga: "contactar para más info"'),
-        (r'pregunt[ae]r?\s*(por|for)', 'Información vaga: "preguntar por detalles"'),
-        (r'no\s+preguntas?\s+tontas?', 'Lenguaje hostil hacia compradores'),
-        (r'solo\s+interesados?', 'Filtro de compradores'),
-    ]
+    description_lower = description.lower()
 
-    for pattern, message in vague_patterns:
-        if re.search(pattern, description.lower()):
+    # Check for vague/uninformative language
+    for pattern, message in VAGUE_PATTERNS:
+        if pattern.search(description_lower):
             flags.append(Flag(type="info", msg=message))
             score_impact += 2
 
     # Check for specific details (positive signals)
-    specificity_patterns = [
-        (r'\b\d+\s*(gb|tb|inch|pulgadas?|cm|mm|kg|lb)\b', 'specs'),
-        (r'\b(modelo|model|serie|series)\s*:?\s*\w+', 'model'),
-        (r'\b(marca|brand)\s*:?\s*\w+', 'brand'),
-        (r'\b\d{4}\b', 'year'),  # Year mention
-        (r'\b(original|auténtico|genuine|authentic)\b', 'authenticity'),
-        (r'\b(garant[ií]a|warranty)\b', 'warranty'),
-        (r'\b(factura|receipt|invoice)\b', 'receipt'),
-    ]
-
     specific_details_found = []
-    for pattern, detail_type in specificity_patterns:
-        if re.search(pattern, description.lower()):
+    for pattern, detail_type in SPECIFICITY_PATTERNS:
+        if pattern.search(description_lower):
             specific_details_found.append(detail_type)
 
     details["specific_details"] = specific_details_found
@@ -959,8 +1030,8 @@ async def description_quality_agent(request: MarketplaceRequest) -> dict:
 
     # Check if description matches title (consistency)
     title_words = set(title.lower().split())
-    desc_words = set(description.lower().split())
-    common_words = title_words & desc_words
+    # intersection() probes the title set per description word without building a set of the description
+    common_words = title_words.intersection(description_lower.split())
     relevance_score = len(common_words) / max(len(title_words), 1)
     details["title_description_relevance"] = round(relevance_score, 2)
 
@@ -1141,24 +1212,66 @@ def _build_listing_summary(request: MarketplaceRequest) -> str:
     return "\n".join(parts) if parts else "Información de la publicación no disponible."
 
 
+# Flag types included in the LLM's flag summary, in order, with their section headings
+FLAG_SUMMARY_SECTIONS = (
+    ("critical", "ALERTAS CRÍTICAS"),
+    ("warning", "ADVERTENCIAS"),
+    ("info", "INFORMACIÓN"),
+)
+
+
 def _build_flags_summary(flags: List[Flag]) -> str:
     """Build a summary of detected flags for the LLM."""
     if not flags:
         return "No se detectaron banderas de alerta."
 
-    critical = [f.msg for f in flags if f.type == "critical"]
-    warnings = [f.msg for f in flags if f.type == "warning"]
-    info = [f.msg for f in flags if f.type == "info"]
+    # Bucket messages by type in one pass; other flag types are left out of the summary
+    messages = {flag_type: [] for flag_type, _ in FLAG_SUMMARY_SECTIONS}
+    for f in flags:
+        bucket = messages.get(f.type)
+        if bucket is not None:
+            bucket.append(f.msg)
+
+    return "\n\n".join(
+        f"{heading}:\n" + "\n".join(f"  - {m}" for m in messages[flag_type])
+        for flag_type, heading in FLAG_SUMMARY_SECTIONS
+        if messages[flag_type]
+    )
 
-    parts = []
-    if critical:
-        parts.append(f"ALERTAS CRÍTICAS:\n" + "\n".join(f"  - {m}" for m in critical))
-    if warnings:
-        parts.append(f"ADVERTENCIAS:\n" + "\n".join(f"  - {m}" for m in warnings))
-    if info:
-        parts.append(f"INFORMACIÓN:\n" + "\n".join(f"  - {m}" for m in info))
 
-    return "\n\n".join(parts)
+# Static so the system block (with the response schema) is served from Anthropic's
+# prompt cache across listings; per-listing data goes only in the user message
+SUPPLIER_CONFIDENCE_SYSTEM_MESSAGE = """Eres un experto chileno en detectar estafas en Facebook Marketplace. Tu personalidad:
+
+ESTILO:
+- Eres directo y sin rodeos, pero explicativo
+- Tienes un humor negro y eres ligeramente cínico
+- Te preocupas genuinamente por proteger al comprador
+
+TÍTULOS CREATIVOS (ejemplos):
+- "Huele a humo... y no es asado"
+- "Este vendedor brilla más que el sol"
+- "No le compraría ni chicle a este compadre"
+- "Procede con ojo, puede ser trucho"
+- "La firme, se ve legit"
+
+TU ANÁLISIS DEBE INCLUIR:
+1. verdict_message: Explicación DETALLADA (4-5 oraciones) que DEBE mencionar:
+   - Información del vendedor (antigüedad, calificaciones)
+   - Análisis del precio (¿razonable o sospechoso?)
+   - DESCRIPCIÓN DE LAS IMÁGENES: qué se ve, estado del producto, si parecen auténticas
+   - Conclusión y recomendación
+
+2. key_concerns: Lista preocupaciones específicas incluyendo sobre las imágenes si aplica
+   (ej: "Fotos parecen de catálogo", "Producto se ve muy usado para el precio")
+
+3. positive_signals: Lista señales positivas incluyendo sobre las imágenes
+   (ej: "Fotos reales tomadas en casa", "Se ve el producto desde varios ángulos")
+
+CRITERIOS DE SCORE:
+- 80-100: Vendedor confiable, bajo riesgo (cuenta antigua, buenas reviews, precio razonable, fotos auténticas)
+- 50-79: Sospechoso, proceder con precaución (algunos red flags pero no definitivos)
+- 0-49: Alto riesgo de estafa (cuenta nueva, precio irreal, fotos de stock, señales claras de scam)"""
 
 
 async def supplier_confidence_agent(
@@ -1234,37 +1347,7 @@ Necesito que:
     messages = [
         {
             "role": "system",
-            "content": """Eres un experto chileno en detectar estafas en Facebook Marketplace. Tu personalidad:
-
-ESTILO:
-- Eres directo y sin rodeos, pero explicativo
-- Tienes un humor negro y eres ligeramente cínico
-- Te preocupas genuinamente por proteger al comprador
-
-TÍTULOS CREATIVOS (ejemplos):
-- "Huele a humo... y no es asado"
-- "Este vendedor brilla más que el sol"
-- "No le compraría ni chicle a este compadre"
-- "Procede con ojo, puede ser trucho"
-- "La firme, se ve legit"
-
-TU ANÁLISIS DEBE INCLUIR:
-1. verdict_message: Explicación DETALLADA (4-5 oraciones) que DEBE mencionar:
-   - Información del vendedor (antigüedad, calificaciones)
-   - Análisis del precio (¿razonable o sospechoso?)
-   - DESCRIPCIÓN DE LAS IMÁGENES: qué se ve, estado del producto, si parecen auténticas
-   - Conclusión y recomendación
-
-2. key_concerns: Lista preocupaciones específicas incluyendo sobre las imágenes si aplica
-   (ej: "Fotos parecen de catálogo", "Producto se ve muy usado para el precio")
-
-3. positive_signals: Lista señales positivas incluyendo sobre las imágenes
-   (ej: "Fotos reales tomadas en casa", "Se ve el producto desde varios ángulos")
-
-CRITERIOS DE SCORE:
-- 80-100: Vendedor confiable, bajo riesgo (cuenta antigua, buenas reviews, precio razonable, fotos auténticas)
-- 50-79: Sospechoso, proceder con precaución (algunos red flags pero no definitivos)
-- 0-49: Alto riesgo de estafa (cuenta nueva, precio irreal, fotos de stock, señales claras de scam)"""
+            "content": SUPPLIER_CONFIDENCE_SYSTEM_MESSAGE
         },
         {
             "role": "user",
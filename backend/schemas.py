@@ -38,6 +38,16 @@ class AnalysisRequest(BaseModel):
     protocol: Optional[str] = None
 
 
+class BatchAnalysisRequest(BaseModel):
+    """Several pages analyzed in one call (e.g. every open tab)."""
+    items: List[AnalysisRequest]
+
+
+class BatchItemError(BaseModel):
+    """Stands in for an AnalysisResult in batch responses when that item's analysis failed."""
+    error: str
+
+
 class Flag(BaseModel):
     type: str  # critical, warning, info
     msg: str
@@ -143,3 +153,8 @@ class MarketplaceRequest(BaseModel):
     # Additional context
     seller_other_listings: List[str] = []  # URLs or titles of other listings
 
+
+class BatchMarketplaceRequest(BaseModel):
+    """Several Marketplace listings analyzed in one call (e.g. a search results page)."""
+    items: List[MarketplaceRequest]
+
@@ -19,23 +19,160 @@ Usage:
     async with MarketplaceScraper() as scraper:
         listing_data = await scraper.scrape_listing("https://facebook.com/marketplace/item/123")
         seller_data = await scraper.scrape_seller_profile("https://facebook.com/marketplace/profile/456")
+        listings = await scraper.scrape_listings_batch([url_1, url_2, url_3])
+
+    # Or, in a long-running service, the process-wide scraper (closed with close_scraper())
+    scraper = await get_scraper()
 """
 
 import asyncio
 import re
+import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
+from urllib.parse import urlsplit
 
 # Conditional import - service degrades gracefully if playwright not installed
 try:
-    from playwright.async_api import async_playwright, Browser, Page
+    from playwright.async_api import async_playwright, Browser, BrowserContext, Page
     PLAYWRIGHT_AVAILABLE = True
 except ImportError:
     PLAYWRIGHT_AVAILABLE = False
+    Browser = BrowserContext = Page = None  # Keeps the annotations below importable
     print("[WARNING] Playwright not installed. Backend scraping disabled.")
     print("          Install with: pip install playwright && playwright install chromium")
 
+# Complete scrapes by canonical URL; re-scraping the same listing or profile within the
+# TTL skips the browser entirely. Failed or partial scrapes (errors, login walls, pages
+# that hadn't rendered) are not cached so they are retried
+# Key: ("listing" | "seller", canonical URL, *capture options)
+# Value: (expires_at, scraped data)
+_scrape_cache: "OrderedDict[tuple, Tuple[float, Any]]" = OrderedDict()
+SCRAPE_CACHE_SIZE = 100
+SCRAPE_CACHE_TTL = 600  # seconds
+
+
+def _canonical_url(url: str) -> str:
+    """Host and path of a URL, without scheme, www., query string, fragment or trailing slash"""
+    parts = urlsplit(url.strip())
+    return parts.netloc.lower().removeprefix("www.") + parts.path.rstrip("/")
+
+
+def _scrape_cache_get(key: tuple) -> Optional[Any]:
+    cached = _scrape_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        _scrape_cache.move_to_end(key)
+        # A copy, so callers mutating their result can't change later hits
+        data = cached[1]
+        return type(data)(**data.as_dict())
+    return None
+
+
+def _scrape_cache_set(key: tuple, data: Any) -> None:
+    # Stores a copy too: the caller keeps (and may mutate) the instance it scraped
+    _scrape_cache[key] = (time.monotonic() + SCRAPE_CACHE_TTL, type(data)(**data.as_dict()))
+    _scrape_cache.move_to_end(key)
+    if len(_scrape_cache) > SCRAPE_CACHE_SIZE:
+        _scrape_cache.popitem(last=False)
+
+
+# Requests aborted before they hit the network. The extractors only read text and
+# attributes, so fonts, video and trackers are pure download cost. Stylesheets are
+# always loaded: innerText depends on them (hidden elements are left out of it)
+BLOCKED_RESOURCE_TYPES = frozenset({'font', 'media'})
+BLOCKED_HOSTS = frozenset({'connect.facebook.net', 'www.google-analytics.com', 'www.googletagmanager.com'})
+# Image bytes are only needed for the screenshot; <img src> attributes are in the DOM regardless
+BLOCKED_RESOURCE_TYPES_NO_SCREENSHOT = BLOCKED_RESOURCE_TYPES | {'image'}
+
+
+# Collects the listing's DOM data in a single page.evaluate call; reading it element by
+# element costs a browser round trip per query/attribute (two per image)
+LISTING_DOM_JS = """() => {
+    const h1 = document.querySelector('h1');
+
+    // Listing images, skipping tiny ones (icons, etc.), limited to 10
+    const imageUrls = new Set();
+    for (const img of document.querySelectorAll('img[src*="scontent"], img[src*="fbcdn"]')) {
+        const src = img.getAttribute('src');
+        if (!src || imageUrls.has(src)) continue;
+        const width = img.getAttribute('width');
+        if (!width || parseInt(width, 10) > 100) imageUrls.add(src);
+        if (imageUrls.size === 10) break;
+    }
+
+    const sellerLink = document.querySelector('a[href*="/marketplace/profile/"]');
+    return {
+        title: h1 ? h1.innerText.trim() : null,
+        bodyText: document.body.innerText,
+        imageUrls: [...imageUrls],
+        sellerLink: sellerLink ? {text: sellerLink.innerText, href: sellerLink.getAttribute('href')} : null,
+    };
+}"""
+
+# Elements whose presence means the client-rendered content is in. Removed listings and
+# login/captcha walls never render them, so the wait is capped by content_timeout
+LISTING_READY_SELECTOR = 'h1'
+SELLER_READY_SELECTOR = 'h1, a[href*="/marketplace/item/"]'
+
+# Scrolls down in steps to trigger lazy loading. After each step it waits for the page
+# to grow (document.body.scrollHeight past its value before the step) rather than a
+# fixed pause, at most maxWait ms, and stops early once it is at the bottom and the
+# page stopped growing. Ends back at the top
+SCROLL_PAGE_JS = """async ({scrolls, step, maxWait}) => {
+    // Inserted nodes and loaded images both grow the page; only the first is a DOM mutation
+    const grown = height => new Promise(resolve => {
+        const check = () => { if (document.body.scrollHeight > height) finish(true); };
+        const mutations = new MutationObserver(check);
+        const resizes = new ResizeObserver(check);
+        const timer = setTimeout(() => finish(false), maxWait);
+        const finish = result => {
+            mutations.disconnect();
+            resizes.disconnect();
+            clearTimeout(timer);
+            resolve(result);
+        };
+        mutations.observe(document.body, {childList: true, subtree: true});
+        resizes.observe(document.body);
+    });
+
+    for (let i = 0; i < scrolls; i++) {
+        const height = document.body.scrollHeight;
+        window.scrollBy(0, step);
+        const atBottom = window.innerHeight + window.scrollY >= height;
+        if (!(await grown(height)) && atBottom) break;
+    }
+    window.scrollTo(0, 0);
+}"""
+
+# --- Parsing patterns (matched against a page's visible text) ---
+
+# Seller profile
+JOIN_DATE_RE = re.compile(r'(se\s+unió\s+a?\s*facebook\s+(en\s+)?\d{4}|joined\s+(facebook\s+)?(in\s+)?\d{4})', re.I)
+LISTINGS_COUNT_RE = re.compile(r'(\d+)\+?\s*(publicaciones?|listings?)', re.I)
+FOLLOWERS_RE = re.compile(r'(\d+)\s*(seguidores|followers)', re.I)
+RATINGS_COUNT_RE = re.compile(r'(\d+)\s*(calificaciones?|ratings?|reviews?)', re.I)
+SELLER_LOCATION_RE = re.compile(r'(vive\s+en|lives\s+in)\s+([^,\n]+)', re.I)
+GOOD_RATING_BADGE_RE = re.compile(r'buena\s+calificaci[oó]n|good\s+rating', re.I)
+FAST_RESPONSE_BADGE_RE = re.compile(r'responde\s+r[aá]pido|responds?\s+(quickly|fast)', re.I)
+TOP_SELLER_BADGE_RE = re.compile(r'vendedor\s+(destacado|top)|top\s+seller', re.I)
+STRENGTH_RE = re.compile(r'(comunicaci[oó]n|puntualidad|descripci[oó]n|precio)\s*\((\d+)\)', re.I)
+
+# Listing (tried in order)
+PRICE_PATTERNS = tuple(re.compile(pattern, re.I) for pattern in (
+    r'\$\s*[\d,]+',
+    r'[\d\s]+\s*\$',
+    r'gratis|free',
+))
+DESCRIPTION_RE = re.compile(r'(detalles|details)\s*[\n:]\s*(.{10,500})', re.I | re.S)
+LISTING_LOCATION_RE = re.compile(r'(publicado\s+en|listed\s+in)\s+([^,\n]+)', re.I)
+POSTED_DATE_PATTERNS = tuple(re.compile(pattern, re.I) for pattern in (
+    r'(hace\s+\d+\s+(?:día|días|hora|horas|semana|semanas|mes|meses))',
+    r'(\d+\s+(?:day|days|hour|hours|week|weeks|month|months)\s+ago)',
+    r'(ayer|yesterday|hoy|today)',
+))
+
 
 @dataclass
 class ScrapedListingData:
@@ -52,9 +189,16 @@ class ScrapedListingData:
     seller_name: Optional[str] = None
     seller_profile_url: Optional[str] = None
     screenshot_base64: Optional[str] = None
-    raw_html: Optional[str] = None
+    raw_html: Optional[str] = None  # Only with scrape_listing(capture_html=True)
     scraped_at: str = field(default_factory=lambda: datetime.now().isoformat())
 
+    def as_dict(self) -> Dict[str, Any]:
+        """Shallow dict of the fields; asdict() recursively deep-copies every one"""
+        data = dict(self.__dict__)
+        # Scrapes are cached and shared, so callers get their own lists
+        data['image_urls'] = list(self.image_urls)
+        return data
+
 
 @dataclass
 class ScrapedSellerData:
@@ -77,6 +221,14 @@ class ScrapedSellerData:
     screenshot_base64: Optional[str] = None
     scraped_at: str = field(default_factory=lambda: datetime.now().isoformat())
 
+    def as_dict(self) -> Dict[str, Any]:
+        """Shallow dict of the fields; asdict() recursively deep-copies every one"""
+        data = dict(self.__dict__)
+        # Scrapes are cached and shared, so callers get their own lists
+        data['badges'] = list(self.badges)
+        data['strengths'] = list(self.strengths)
+        return data
+
 
 class MarketplaceScraper:
     """
@@ -87,18 +239,36 @@ class MarketplaceScraper:
             data = await scraper.scrape_listing(url)
     """
 
-    def __init__(self, headless: bool = True, timeout: int = 30000):
+    def __init__(
+        self,
+        headless: bool = True,
+        timeout: int = 30000,
+        scroll_delay: float = 0.3,
+        max_pages_per_context: int = 200,
+        content_timeout: int = 3000
+    ):
         """
         Initialize the scraper.
 
         Args:
             headless: Run browser in headless mode (default: True)
             timeout: Default timeout for page operations in ms (default: 30s)
+            scroll_delay: Longest wait for lazy content after each scroll step, in seconds (default: 0.3)
+            max_pages_per_context: Pages opened before the browser context is replaced by a
+                fresh one, bounding the memory and cookies/storage it accumulates (default: 200)
+            content_timeout: Longest wait for the page's content to render after navigation,
+                in ms; pages that never render it are scraped as they are (default: 3s)
         """
         self.headless = headless
         self.timeout = timeout
+        self.scroll_delay = scroll_delay
+        self.max_pages_per_context = max_pages_per_context
+        self.content_timeout = content_timeout
         self._playwright = None
         self._browser: Optional[Browser] = None
+        self._context: Optional[BrowserContext] = None
+        self._context_pages = 0
+        self._context_lock = asyncio.Lock()
 
     async def __aenter__(self):
         """Async context manager entry - starts browser"""
@@ -110,40 +280,98 @@ class MarketplaceScraper:
             headless=self.headless,
             args=['--disable-blink-features=AutomationControlled']
         )
+        # One context for every scrape: pages are cheap, contexts (with their
+        # viewport, user agent and init scripts) are not
+        self._context = await self._new_context()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit - closes browser"""
+        if self._context:
+            await self._context.close()
         if self._browser:
             await self._browser.close()
         if self._playwright:
             await self._playwright.stop()
 
-    async def _create_page(self) -> Page:
-        """Create a new page with anti-detection measures"""
+    async def warmup(self) -> None:
+        """Open and close a blank page so the first scrape doesn't pay for the renderer process"""
+        page = await self._create_page()
+        await self._close_page(page)
+
+    async def _new_context(self) -> BrowserContext:
+        """Create a browser context with the anti-detection settings"""
         context = await self._browser.new_context(
             viewport={'width': 1920, 'height': 1080},
             user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             locale='es-CL'
         )
-        page = await context.new_page()
-        page.set_default_timeout(self.timeout)
 
-        # Remove webdriver flag
-        await page.add_init_script("""
+        # Remove webdriver flag (applies to every page opened in the context)
+        await context.add_init_script("""
             Object.defineProperty(navigator, 'webdriver', {
                 get: () => undefined
             });
         """)
+        return context
+
+    async def _close_page(self, page: Page) -> None:
+        """Close a page, and its context too if that was retired and this was its last page"""
+        context = page.context
+        await page.close()
+        if context is not self._context and not context.pages:
+            await context.close()
+
+    async def _create_page(self, load_images: bool = True) -> Page:
+        """
+        Create a new page in the shared context (anti-detection measures already applied)
+
+        Args:
+            load_images: Download images; only needed when a screenshot is taken (default: True)
+
+        Returns:
+            Page that aborts requests the scraper doesn't need
+        """
+        async with self._context_lock:
+            if self._context_pages >= self.max_pages_per_context:
+                # Retire the context; pages still open in it (concurrent scrapes) finish
+                # normally and _close_page closes it after the last one
+                retired = self._context
+                self._context = await self._new_context()
+                self._context_pages = 0
+                if not retired.pages:
+                    await retired.close()
+            self._context_pages += 1
+            page = await self._context.new_page()
+        page.set_default_timeout(self.timeout)
+
+        blocked_types = BLOCKED_RESOURCE_TYPES if load_images else BLOCKED_RESOURCE_TYPES_NO_SCREENSHOT
+
+        async def block_unneeded(route):
+            request = route.request
+            if request.resource_type in blocked_types or urlsplit(request.url).hostname in BLOCKED_HOSTS:
+                await route.abort()
+            else:
+                await route.continue_()
 
+        await page.route('**/*', block_unneeded)
         return page
 
-    async def scrape_listing(self, url: str) -> ScrapedListingData:
+    async def scrape_listing(
+        self,
+        url: str,
+        use_cache: bool = True,
+        capture_html: bool = False,
+        capture_screenshot: bool = True
+    ) -> ScrapedListingData:
         """
         Scrape data from a Facebook Marketplace listing.
 
         Args:
             url: Full URL to the marketplace listing
+            use_cache: Return a recent scrape of the same listing if there is one (default: True)
+            capture_html: Include the page's full HTML, often several MB (default: False)
+            capture_screenshot: Include a base64 JPEG screenshot (default: True)
 
         Returns:
             ScrapedListingData object with extracted information
@@ -151,55 +379,69 @@ class MarketplaceScraper:
         if not self._browser:
             raise RuntimeError("Scraper not initialized. Use 'async with MarketplaceScraper() as scraper:'")
 
-        page = await self._create_page()
+        cache_key = ("listing", _canonical_url(url), capture_html, capture_screenshot)
+        if use_cache:
+            cached = _scrape_cache_get(cache_key)
+            if cached is not None:
+                return cached
+
+        page = await self._create_page(load_images=capture_screenshot)
         data = ScrapedListingData(url=url)
 
         try:
-            await page.goto(url, wait_until='networkidle')
-            await asyncio.sleep(2)  # Wait for dynamic content
+            await page.goto(url, wait_until='domcontentloaded')
+            await self._wait_for_content(page, LISTING_READY_SELECTOR)
 
             # Scroll to load lazy content
             await self._scroll_page(page)
 
+            # Read everything the extractors need from the DOM in one round trip
+            dom = await page.evaluate(LISTING_DOM_JS)
+
             # Extract listing data
-            data.title = await self._extract_text(page, 'h1')
-            data.price = await self._extract_price(page)
-            data.description = await self._extract_description(page)
-            data.condition = await self._extract_condition(page)
-            data.location = await self._extract_location(page)
-            data.posted_date = await self._extract_posted_date(page)
+            data.title = dom['title']
+            page_text = dom['bodyText']
+            data.price = self._extract_price(page_text)
+            data.description = self._extract_description(page_text)
+            data.condition = self._extract_condition(page_text)
+            data.location = self._extract_location(page_text)
+            data.posted_date = self._extract_posted_date(page_text)
 
             # Extract images
-            data.image_urls = await self._extract_image_urls(page)
+            data.image_urls = dom['imageUrls']
             data.image_count = len(data.image_urls)
 
             # Extract seller info
-            seller_link = await page.query_selector('a[href*="/marketplace/profile/"]')
-            if seller_link:
-                data.seller_name = await seller_link.inner_text()
-                data.seller_profile_url = await seller_link.get_attribute('href')
-
-            # Capture screenshot
-            screenshot = await page.screenshot(type='png')
-            import base64
-            data.screenshot_base64 = base64.b64encode(screenshot).decode('utf-8')
-
-            # Get raw HTML for fallback parsing
-            data.raw_html = await page.content()
-
+            if dom['sellerLink']:
+                data.seller_name = dom['sellerLink']['text']
+                data.seller_profile_url = dom['sellerLink']['href']
+
+            # Screenshot and raw HTML (for fallback parsing) are independent CDP calls; run
+            # whichever were requested concurrently
+            captures = {}
+            if capture_screenshot:
+                captures["screenshot_base64"] = self._capture_screenshot(page)
+            if capture_html:
+                captures["raw_html"] = page.content()
+            for field_name, value in zip(captures, await asyncio.gather(*captures.values())):
+                setattr(data, field_name, value)
+
+            if data.title and data.price:
+                _scrape_cache_set(cache_key, data)
         except Exception as e:
             print(f"[ERROR] Scraping listing failed: {e}")
         finally:
-            await page.close()
+            await self._close_page(page)
 
         return data
 
-    async def scrape_seller_profile(self, profile_url: str) -> ScrapedSellerData:
+    async def scrape_seller_profile(self, profile_url: str, use_cache: bool = True) -> ScrapedSellerData:
         """
         Scrape data from a Facebook Marketplace seller profile.
 
         Args:
             profile_url: Full URL to the seller's marketplace profile
+            use_cache: Return a recent scrape of the same profile if there is one (default: True)
 
         Returns:
             ScrapedSellerData object with extracted information
@@ -207,12 +449,18 @@ class MarketplaceScraper:
         if not self._browser:
             raise RuntimeError("Scraper not initialized. Use 'async with MarketplaceScraper() as scraper:'")
 
+        cache_key = ("seller", _canonical_url(profile_url))
+        if use_cache:
+            cached = _scrape_cache_get(cache_key)
+            if cached is not None:
+                return cached
+
         page = await self._create_page()
         data = ScrapedSellerData(profile_url=profile_url)
 
         try:
-            await page.goto(profile_url, wait_until='networkidle')
-            await asyncio.sleep(2)
+            await page.goto(profile_url, wait_until='domcontentloaded')
+            await self._wait_for_content(page, SELLER_READY_SELECTOR)
 
             # Scroll to load content
             await self._scroll_page(page)
@@ -224,72 +472,137 @@ class MarketplaceScraper:
             page_text = await page.inner_text('body')
 
             # Join date
-            join_match = re.search(r'(se\s+unió\s+a?\s*facebook\s+(en\s+)?\d{4}|joined\s+(facebook\s+)?(in\s+)?\d{4})', page_text, re.I)
+            join_match = JOIN_DATE_RE.search(page_text)
             if join_match:
                 data.join_date = join_match.group(0)
                 data.profile_completeness += 15
 
             # Listings count
-            listings_match = re.search(r'(\d+)\+?\s*(publicaciones?|listings?)', page_text, re.I)
+            listings_match = LISTINGS_COUNT_RE.search(page_text)
             if listings_match:
                 data.listings_count = listings_match.group(1) + '+'
                 data.profile_completeness += 10
 
             # Followers
-            followers_match = re.search(r'(\d+)\s*(seguidores|followers)', page_text, re.I)
+            followers_match = FOLLOWERS_RE.search(page_text)
             if followers_match:
                 data.followers_count = int(followers_match.group(1))
                 data.profile_completeness += 10
 
             # Ratings count
-            ratings_match = re.search(r'(\d+)\s*(calificaciones?|ratings?|reviews?)', page_text, re.I)
+            ratings_match = RATINGS_COUNT_RE.search(page_text)
             if ratings_match:
                 data.ratings_count = int(ratings_match.group(1))
                 data.profile_completeness += 15
 
             # Location
-            location_match = re.search(r'(vive\s+en|lives\s+in)\s+([^,\n]+)', page_text, re.I)
+            location_match = SELLER_LOCATION_RE.search(page_text)
             if location_match:
                 data.location = location_match.group(2).strip()
                 data.profile_completeness += 5
 
             # Badges
-            if re.search(r'buena\s+calificaci[oó]n|good\s+rating', page_text, re.I):
+            if GOOD_RATING_BADGE_RE.search(page_text):
                 data.badges.append('Buena calificación')
                 data.profile_completeness += 5
-            if re.search(r'responde\s+r[aá]pido|responds?\s+(quickly|fast)', page_text, re.I):
+            if FAST_RESPONSE_BADGE_RE.search(page_text):
                 data.badges.append('Responde rápido')
                 data.profile_completeness += 5
-            if re.search(r'vendedor\s+(destacado|top)|top\s+seller', page_text, re.I):
+            if TOP_SELLER_BADGE_RE.search(page_text):
                 data.badges.append('Vendedor destacado')
                 data.profile_completeness += 5
 
             # Strengths
-            for match in re.finditer(r'(comunicaci[oó]n|puntualidad|descripci[oó]n|precio)\s*\((\d+)\)', page_text, re.I):
+            for match in STRENGTH_RE.finditer(page_text):
                 data.strengths.append(f"{match.group(1)} ({match.group(2)})")
 
             # Capture screenshot
-            screenshot = await page.screenshot(type='png')
-            import base64
-            data.screenshot_base64 = base64.b64encode(screenshot).decode('utf-8')
+            data.screenshot_base64 = await self._capture_screenshot(page)
 
             # Cap completeness
             data.profile_completeness = min(100, data.profile_completeness)
 
+            if data.name:
+                _scrape_cache_set(cache_key, data)
         except Exception as e:
             print(f"[ERROR] Scraping seller profile failed: {e}")
         finally:
-            await page.close()
+            await self._close_page(page)
 
         return data
 
+    async def scrape_listings_batch(self, urls: List[str], max_concurrency: int = 5) -> List[ScrapedListingData]:
+        """
+        Scrape several listings concurrently in the shared browser context.
+
+        Args:
+            urls: Listing URLs
+            max_concurrency: Maximum number of pages open at once (default: 5)
+
+        Returns:
+            ScrapedListingData objects in the same order as urls
+        """
+        return await self._gather_limited(self.scrape_listing, urls, max_concurrency)
+
+    async def scrape_seller_profiles_batch(self, profile_urls: List[str], max_concurrency: int = 5) -> List[ScrapedSellerData]:
+        """
+        Scrape several seller profiles concurrently in the shared browser context.
+
+        Args:
+            profile_urls: Seller profile URLs
+            max_concurrency: Maximum number of pages open at once (default: 5)
+
+        Returns:
+            ScrapedSellerData objects in the same order as profile_urls
+        """
+        return await self._gather_limited(self.scrape_seller_profile, profile_urls, max_concurrency)
+
+    async def _gather_limited(self, scrape, urls: List[str], max_concurrency: int) -> list:
+        """Run scrape over urls with at most max_concurrency pages open (each page costs browser memory)"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def scrape_one(url: str):
+            async with semaphore:
+                return await scrape(url)
+
+        # scrape_listing/scrape_seller_profile already catch per-page errors and return partial data
+        return await asyncio.gather(*(scrape_one(url) for url in urls))
+
+    async def _wait_for_content(self, page: Page, selector: str) -> None:
+        """
+        Wait until the client-rendered content is in the DOM. Facebook keeps analytics
+        requests open long after that, so waiting for network idle mostly waits on them.
+        Pages that never render it (e.g. login walls) are scraped as they are.
+        """
+        try:
+            await page.wait_for_selector(selector, timeout=self.content_timeout)
+        except Exception:
+            pass
+
+    async def _capture_screenshot(self, page: Page) -> str:
+        """
+        Base64 JPEG of the viewport, taken through the Chrome DevTools Protocol.
+        CDP returns the image already base64-encoded, and JPEG is several times smaller
+        than PNG (same format and quality as the extension's captures).
+        """
+        cdp = await page.context.new_cdp_session(page)
+        try:
+            result = await cdp.send('Page.captureScreenshot', {
+                'format': 'jpeg',
+                'quality': 80,
+                'optimizeForSpeed': True,
+            })
+        finally:
+            await cdp.detach()
+        return result['data']
+
     async def _scroll_page(self, page: Page, scrolls: int = 5) -> None:
-        """Scroll page to trigger lazy loading"""
-        for _ in range(scrolls):
-            await page.evaluate('window.scrollBy(0, 500)')
-            await asyncio.sleep(0.3)
-        # Scroll back to top
-        await page.evaluate('window.scrollTo(0, 0)')
+        """Scroll page to trigger lazy loading (a single round trip, see SCROLL_PAGE_JS)"""
+        await page.evaluate(SCROLL_PAGE_JS, {
+            'scrolls': scrolls,
+            'step': 500,
+            'maxWait': self.scroll_delay * 1000,
+        })
 
     async def _extract_text(self, page: Page, selector: str) -> Optional[str]:
         """Safely extract text from an element"""
@@ -301,83 +614,79 @@ class MarketplaceScraper:
             pass
         return None
 
-    async def _extract_price(self, page: Page) -> Optional[str]:
-        """Extract price from listing"""
+    def _extract_price(self, text: str) -> Optional[str]:
+        """Extract price from listing text"""
         # Try various price patterns
-        patterns = [
-            r'\$\s*[\d,]+',
-            r'[\d\s]+\s*\$',
-            r'gratis|free',
-        ]
-
-        text = await page.inner_text('body')
-        for pattern in patterns:
-            match = re.search(pattern, text, re.I)
+        for pattern in PRICE_PATTERNS:
+            match = pattern.search(text)
             if match:
                 return match.group(0).strip()
         return None
 
-    async def _extract_description(self, page: Page) -> Optional[str]:
-        """Extract listing description"""
-        # Look for description section
-        text = await page.inner_text('body')
-
+    def _extract_description(self, text: str) -> Optional[str]:
+        """Extract listing description from listing text"""
         # Try to find description after "Detalles" or "Details"
-        match = re.search(r'(detalles|details)\s*[\n:]\s*(.{10,500})', text, re.I | re.S)
+        match = DESCRIPTION_RE.search(text)
         if match:
             return match.group(2).strip()
         return None
 
-    async def _extract_condition(self, page: Page) -> Optional[str]:
-        """Extract item condition"""
+    def _extract_condition(self, text: str) -> Optional[str]:
+        """Extract item condition from listing text"""
         conditions = ['new', 'used', 'like new', 'good', 'fair',
                      'nuevo', 'usado', 'como nuevo', 'buen estado']
 
-        text = (await page.inner_text('body')).lower()
+        text = text.lower()
         for condition in conditions:
             if condition in text:
                 return condition.title()
         return None
 
-    async def _extract_location(self, page: Page) -> Optional[str]:
-        """Extract listing location"""
-        text = await page.inner_text('body')
-
-        match = re.search(r'(publicado\s+en|listed\s+in)\s+([^,\n]+)', text, re.I)
+    def _extract_location(self, text: str) -> Optional[str]:
+        """Extract listing location from listing text"""
+        match = LISTING_LOCATION_RE.search(text)
         if match:
             return match.group(2).strip()
         return None
 
-    async def _extract_posted_date(self, page: Page) -> Optional[str]:
-        """Extract when listing was posted"""
-        text = await page.inner_text('body')
-
-        patterns = [
-            r'(hace\s+\d+\s+(?:día|días|hora|horas|semana|semanas|mes|meses))',
-            r'(\d+\s+(?:day|days|hour|hours|week|weeks|month|months)\s+ago)',
-            r'(ayer|yesterday|hoy|today)',
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.I)
+    def _extract_posted_date(self, text: str) -> Optional[str]:
+        """Extract when listing was posted from listing text"""
+        for pattern in POSTED_DATE_PATTERNS:
+            match = pattern.search(text)
             if match:
                 return match.group(1).strip()
         return None
 
-    async def _extract_image_urls(self, page: Page) -> List[str]:
-        """Extract all listing image URLs"""
-        images = await page.query_selector_all('img[src*="scontent"], img[src*="fbcdn"]')
-        urls = []
 
-        for img in images:
-            src = await img.get_attribute('src')
-            if src and src not in urls:
-                # Filter out tiny images (icons, etc.)
-                width = await img.get_attribute('width')
-                if not width or int(width) > 100:
-                    urls.append(src)
+# --- Shared scraper ---
 
-        return urls[:10]  # Limit to 10 images
+# Launching Playwright and Chromium takes 1-2s; a long-running service starts the
+# browser once and reuses it (and its context) for every scrape
+_shared_scraper: Optional[MarketplaceScraper] = None
+_shared_scraper_lock = asyncio.Lock()
+
+
+async def get_scraper() -> MarketplaceScraper:
+    """
+    Returns the process-wide MarketplaceScraper, starting the browser on first use.
+    """
+    global _shared_scraper
+    if _shared_scraper is None:
+        async with _shared_scraper_lock:
+            if _shared_scraper is None:
+                scraper = MarketplaceScraper()
+                await scraper.__aenter__()
+                await scraper.warmup()
+                _shared_scraper = scraper
+    return _shared_scraper
+
+
+async def close_scraper() -> None:
+    """Closes the shared scraper's browser, if it was started (called on app shutdown)."""
+    global _shared_scraper
+    if _shared_scraper is not None:
+        await _shared_scraper.__aexit__(None, None, None)
+        _shared_scraper = None
 
 
 # Utility function for one-off scraping
@@ -394,12 +703,10 @@ async def scrape_marketplace_url(url: str) -> Dict[str, Any]:
     if not PLAYWRIGHT_AVAILABLE:
         return {"error": "Playwright not installed"}
 
-    async with MarketplaceScraper() as scraper:
-        if '/profile/' in url:
-            data = await scraper.scrape_seller_profile(url)
-        else:
-            data = await scraper.scrape_listing(url)
+    scraper = await get_scraper()
+    if '/profile/' in url:
+        data = await scraper.scrape_seller_profile(url)
+    else:
+        data = await scraper.scrape_listing(url)
 
-        # Convert dataclass to dict
-        from dataclasses import asdict
-        return asdict(data)
+    return data.as_dict()
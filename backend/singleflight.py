@@ -0,0 +1,45 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+async def single_flight(
+    in_flight: Dict[Hashable, "asyncio.Future[T]"],
+    key: Hashable,
+    run: Callable[[], Awaitable[T]]
+) -> T:
+    """
+    Runs `run` for the first caller of a key; concurrent callers with the same key
+    await its result (or its exception) instead of running it again.
+
+    `in_flight` maps the keys currently running to their futures; each user keeps its
+    own. If the first caller is cancelled (its client went away), a waiting caller
+    takes over and runs it instead.
+    """
+    while (pending := in_flight.get(key)) is not None:
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise
+            # The first caller was cancelled: take over (or join whoever did)
+
+    future = asyncio.get_running_loop().create_future()
+    in_flight[key] = future
+    try:
+        result = await run()
+    except Exception as e:
+        # Joiners fail the same way; retrieve it so an unawaited future doesn't warn
+        future.set_exception(e)
+        future.exception()
+        raise
+    except BaseException:
+        future.cancel()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        if in_flight.get(key) is future:
+            del in_flight[key]
@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+import httpx
+
+if TYPE_CHECKING:
+    from tavily import AsyncTavilyClient
+
+# Connection pool for Tavily requests. httpx's default keep-alive expiry (5s) drops
+# the TLS connection between most analyses; keep it around for 30s instead.
+TAVILY_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=30)
+TAVILY_TIMEOUT = httpx.Timeout(20.0)
+
+# Shared async Tavily client, created on first use
+# Reusing it keeps its httpx connection pool (and TLS connections) alive across requests
+_tavily_client: Optional["AsyncTavilyClient"] = None
+_http_client: Optional[httpx.AsyncClient] = None
+
+# Search results for a query are stable for hours; repeat analyses of the same
+# site or product reuse them instead of going back to Tavily
+# Key: blake2b digest of the search parameters
+# Value: (expires_at, response)
+_search_cache: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+SEARCH_CACHE_SIZE = 1024
+SEARCH_CACHE_TTL = 3600  # seconds
+
+
+def get_tavily_client() -> Optional["AsyncTavilyClient"]:
+    """
+    Returns the shared AsyncTavilyClient, or None if TAVILY_API_KEY is not configured.
+    """
+    global _tavily_client, _http_client
+    if _tavily_client is None:
+        api_key = os.getenv("TAVILY_API_KEY")
+        if not api_key:
+            return None
+        # Imported here so deployments without a Tavily key never load the SDK
+        from tavily import AsyncTavilyClient
+        _http_client = httpx.AsyncClient(limits=TAVILY_LIMITS, timeout=TAVILY_TIMEOUT)
+        try:
+            _tavily_client = AsyncTavilyClient(api_key=api_key, client=_http_client)
+        except TypeError:
+            # Older SDKs don't accept an external client and manage their own
+            _http_client = None
+            _tavily_client = AsyncTavilyClient(api_key=api_key)
+    return _tavily_client
+
+
+async def cached_search(**params: Any) -> Dict[str, Any]:
+    """
+    TavilyClient.search through the shared client with a TTL cache on the parameters.
+    Errors are not cached and propagate to the caller.
+    """
+    key = hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=16).digest()
+    now = time.monotonic()
+    cached = _search_cache.get(key)
+    if cached and cached[0] > now:
+        _search_cache.move_to_end(key)
+        return cached[1]
+
+    client = get_tavily_client()
+    if client is None:
+        raise RuntimeError("TAVILY_API_KEY not configured")
+    response = await client.search(**params)
+
+    _search_cache[key] = (now + SEARCH_CACHE_TTL, response)
+    _search_cache.move_to_end(key)
+    if len(_search_cache) > SEARCH_CACHE_SIZE:
+        _search_cache.popitem(last=False)
+    return response
+
+
+async def close_tavily_client() -> None:
+    """Releases the shared client's connection pool (called on app shutdown)."""
+    global _tavily_client, _http_client
+    if _tavily_client is not None:
+        await _tavily_client.close()
+        _tavily_client = None
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
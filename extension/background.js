@@ -267,14 +267,15 @@ async function extractSellerProfile(sellerUrl) {
 chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
   if (message.type === 'CAPTURE_SCREENSHOT') {
     // Capture visible tab as base64
+    // JPEG keeps the upload (and the vision model's payload) several times smaller than PNG
     chrome.tabs.captureVisibleTab(
       sender.tab.windowId,
-      { format: 'png', quality: 80 },
+      { format: 'jpeg', quality: 80 },
       (dataUrl) => {
         if (chrome.runtime.lastError) {
           sendResponse({ screenshot: null, error: chrome.runtime.lastError.message });
         } else {
-          // Extract base64 data (remove "data:image/png;base64," prefix)
+          // Extract base64 data (remove "data:image/jpeg;base64," prefix)
           const base64 = dataUrl.split(',')[1];
           sendResponse({ screenshot: base64 });
         }